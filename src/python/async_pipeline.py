@@ -0,0 +1,212 @@
+from client import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_SERIALIZER,
+    detect_anomalies,
+    get_shared_producer,
+    get_timestamps,
+    send_msg,
+    send_raw,
+    serialize_non_json,
+)
+from concurrent.futures import ThreadPoolExecutor
+from data_model import PackageObj
+from latency import LatencyTracker
+from sinks import CsvSink
+import functools
+import asyncio
+import json
+import time
+import os
+
+# Batches that may wait between two stages before the upstream stage blocks
+DEFAULT_QUEUE_SIZE: int = 8
+
+# Marks the end of the stream on the stage queues
+_DONE = object()
+
+
+def _lap(profiler, stage: str, started: int) -> None:
+    # The stages interleave on the event loop, so each one times its own batches
+    if profiler is not None:
+        profiler.add(stage, time.perf_counter_ns() - started)
+
+
+async def _fetch(consumer, executor, out_queue: asyncio.Queue, batch_size: int, timeout_ms: int,
+                 profiler=None) -> None:
+    """Polls the consumer in `executor`, so the event loop keeps decoding meanwhile."""
+    loop = asyncio.get_running_loop()
+    poll = functools.partial(consumer.poll, timeout_ms=timeout_ms, max_records=batch_size)
+    records = []  # Fetched and not yet queued; their positions have moved, so they must be passed on
+    try:
+        while True:
+            started = time.perf_counter_ns()
+            polled = loop.run_in_executor(executor, poll)
+            try:
+                batches = await asyncio.shield(polled)
+            except asyncio.CancelledError:
+                records = [record for partition in (await polled).values() for record in partition]
+                raise
+            records = [record for partition in batches.values() for record in partition]
+            if records:
+                _lap(profiler, "fetch", started)
+                await out_queue.put(records)
+                records = []
+    except asyncio.CancelledError:
+        if records:
+            await out_queue.put(records)
+        raise
+    finally:
+        await out_queue.put(_DONE)
+
+
+async def _decode(in_queue: asyncio.Queue, alert_queue: asyncio.Queue, log_queue: asyncio.Queue,
+                  serializer, latency: LatencyTracker, detector, suppressor, raw_alerts: bool,
+                  profiler=None) -> None:
+    """Decodes each batch, runs detect_anomalies and fans out (key, value, anomalies) alerts and log rows."""
+    while (records := await in_queue.get()) is not _DONE:
+        if profiler is not None:
+            profiler.start()  # Counts the batch and reports periodically
+        started = time.perf_counter_ns()
+        alerts, rows = [], []
+        for msg in records:
+            package = PackageObj(**serializer.deserialize(msg.value))
+            created_at, consumed_at, time_diff = get_timestamps(package)
+            if latency is not None:
+                latency.record(msg.topic, package.payload.sensor_id, time_diff)
+            anomalies = detector.check(package) if detector is not None else detect_anomalies(package)
+            if suppressor is not None:
+                alerts.extend((key, value, ()) for key, value in suppressor.offer(package, anomalies))
+            elif anomalies and raw_alerts:
+                alerts.append((msg.key, msg.value, anomalies))
+            elif anomalies:
+                alerts.append((str(package.payload.sensor_id),
+                               json.loads(json.dumps(package, default=serialize_non_json)), anomalies))
+            rows.append({
+                'Sensor ID': package.payload.sensor_id,
+                'Correlation ID': package.correlation_id,
+                'Created At': created_at,
+                'Consumed At': consumed_at,
+                'Time Difference (seconds)': time_diff
+            })
+        _lap(profiler, "decode_detect", started)
+        if alerts:
+            await alert_queue.put(alerts)
+        await log_queue.put(rows)
+    if suppressor is not None:
+        await alert_queue.put([(key, value, ()) for key, value in suppressor.flush()])
+    await alert_queue.put(_DONE)
+    await log_queue.put(_DONE)
+
+
+async def _publish(in_queue: asyncio.Queue, producer, alert_topic: str, serializer, profiler=None) -> None:
+    """Publishes alerts. KafkaProducer.send only appends to its buffer, so this rarely blocks.
+
+    Encoded (bytes) values are forwarded records and go out unchanged with send_raw.
+    """
+    while (alerts := await in_queue.get()) is not _DONE:
+        started = time.perf_counter_ns()
+        for key, value, anomalies in alerts:
+            if isinstance(value, bytes):
+                send_raw(value, key, alert_topic, producer, anomalies)
+            else:
+                send_msg(key=key, value=value, topic=alert_topic, producer=producer, serializer=serializer)
+        _lap(profiler, "publish", started)
+        await asyncio.sleep(0)  # Yield between batches so the other stages keep flowing
+
+
+async def _write(in_queue: asyncio.Queue, executor, sink, profiler=None) -> None:
+    """Writes log rows in `executor`, so file I/O overlaps with decoding."""
+    loop = asyncio.get_running_loop()
+    while (rows := await in_queue.get()) is not _DONE:
+        started = time.perf_counter_ns()
+        await loop.run_in_executor(executor, sink.write_rows, rows)
+        _lap(profiler, "write", started)
+
+
+async def run_pipeline(
+        consumer,
+        sink,
+        producer=None,
+        alert_topic: str = "ALERT",
+        serializer=None,
+        latency: LatencyTracker = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        timeout_ms: int = 1000,
+        detector=None,
+        suppressor=None,
+        raw_alerts: bool = False,
+        profiler=None,
+) -> None:
+    """Runs fetch -> decode/detect -> (alert publish, log write) as concurrent stages.
+
+    The stages are connected by bounded queues of `queue_size` batches, so a slow
+    stage applies backpressure to the ones before it. Fetching and log writing run
+    in their own threads; the KafkaConsumer is only ever used from the fetch thread.
+    `raw_alerts` forwards anomalous records unchanged, as in recive_msg_with_logging.
+    `profiler` is a profiling.StageProfiler; every batch is timed per stage, and
+    profiled from the event loop thread only.
+
+    When the pipeline is cancelled, as asyncio.run does on Ctrl-C, only fetching
+    stops: the batches already fetched, whose offsets may be auto-committed, are
+    still decoded, published and written before the cancellation is passed on.
+    """
+    if serializer is None:
+        serializer = DEFAULT_SERIALIZER
+    if producer is None:
+        producer = get_shared_producer()
+    decode_queue = asyncio.Queue(maxsize=queue_size)
+    alert_queue = asyncio.Queue(maxsize=queue_size)
+    log_queue = asyncio.Queue(maxsize=queue_size)
+
+    with ThreadPoolExecutor(max_workers=1) as fetch_executor, ThreadPoolExecutor(max_workers=1) as io_executor:
+        fetch = asyncio.create_task(_fetch(consumer, fetch_executor, decode_queue, batch_size, timeout_ms, profiler))
+        stages = [
+            fetch,
+            asyncio.create_task(_decode(decode_queue, alert_queue, log_queue, serializer, latency, detector, suppressor,
+                                        raw_alerts, profiler)),
+            asyncio.create_task(_publish(alert_queue, producer, alert_topic, serializer, profiler)),
+            asyncio.create_task(_write(log_queue, io_executor, sink, profiler)),
+        ]
+        try:
+            pending = set(stages)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+                for stage in done:
+                    # When fetching stops the other stages still drain the queued batches
+                    if stage is not fetch and stage.exception() is not None:
+                        raise stage.exception()
+            fetch.result()
+        except asyncio.CancelledError:
+            fetch.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            raise
+        finally:
+            for stage in stages:
+                stage.cancel()
+
+
+def recive_msg_async(consumer, base_dir="logs", sink: CsvSink = None, serializer=None,
+                     latency: LatencyTracker = None, producer=None, batch_size: int = DEFAULT_BATCH_SIZE,
+                     detector=None, suppressor=None, raw_alerts: bool = False, profiler=None):
+    """Asyncio counterpart of client.recive_msg_with_logging with the same logging and alerts."""
+    if sink is None:
+        sink = CsvSink(os.path.join(base_dir, "sensor_monitoring.csv"))
+    if producer is None:
+        producer = get_shared_producer()
+    try:
+        os.makedirs(base_dir, exist_ok=True)  # Ensure the directory exists
+        asyncio.run(run_pipeline(consumer, sink, producer=producer, serializer=serializer,
+                                 latency=latency, batch_size=batch_size, detector=detector,
+                                 suppressor=suppressor, raw_alerts=raw_alerts, profiler=profiler))
+    except Exception as e:
+        print(f"Error consuming messages: {e}")
+    finally:
+        sink.close()
+        if suppressor is not None:
+            # Publish the windows still open, e.g. when a stage failed, so their alerts are not lost
+            for key, value in suppressor.flush():
+                send_msg(key=key, value=value, topic="ALERT", producer=producer, serializer=serializer)
+            suppressor.report()
+        if profiler is not None:
+            profiler.close()
@@ -0,0 +1,52 @@
+"""Compares the sync recive_msg_with_logging path with the asyncio pipeline.
+
+Both consume the same generated SENSOR_DATA records from an in-memory broker.
+--poll-latency models the broker round-trip per fetch of 500 records.
+
+Run from src/python: python benchmarks/bench_async_pipeline.py [-n 100000]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client import recive_msg_with_logging
+from async_pipeline import recive_msg_async
+from data_model import generate_samples
+from fake_kafka import FakeBroker, FakeConsumer, FakeProducer, StopConsuming
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=100_000, help="number of records")
+    parser.add_argument("--poll-latency", type=float, default=0.002, help="seconds per fetch")
+    args = parser.parse_args()
+
+    broker = FakeBroker()
+    for sensor_id, value in generate_samples(args.n, seed=1, as_bytes=True):
+        broker.append("SENSOR_DATA", value, key=str(sensor_id).encode("utf-8"))
+
+    paths = {
+        "sync": recive_msg_with_logging,
+        "async": recive_msg_async,
+    }
+    print(f"{'path':<8}{'records/s':>12}{'alerts':>10}")
+    for name, recive in paths.items():
+        producer = FakeProducer()
+        consumer = FakeConsumer(broker, "SENSOR_DATA", poll_latency=args.poll_latency)
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            try:
+                recive(consumer, base_dir=tmp, producer=producer)
+            except StopConsuming:
+                pass
+            elapsed = time.perf_counter() - start
+        alerts = sum(len(partition) for partition in producer.broker.topics.get("ALERT", []))
+        print(f"{name:<8}{args.n / elapsed:>12,.0f}{alerts:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Compares the in-memory and streaming events_per_second modes on a synthetic log.
+
+Run from src/python: python benchmarks/bench_events_per_second.py [-n 2000000]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sinks import CsvSink
+from events_per_second import calculate_events_per_second, calculate_events_per_second_streaming
+
+
+def write_log(file_path: str, n: int, rate: int = 10000) -> None:
+    """Writes a sensor_monitoring.csv style log with `rate` events per second."""
+    start = datetime(2024, 11, 20, 10, 0, 0)
+    with CsvSink(file_path, flush_rows=100_000) as sink:
+        for i in range(n):
+            created_at = start + timedelta(microseconds=i * 1_000_000 // rate)
+            sink.write({
+                'Sensor ID': i % 6 + 1,
+                'Correlation ID': f"{i:032x}",
+                'Created At': created_at,
+                'Consumed At': created_at + timedelta(milliseconds=3),
+                'Time Difference (seconds)': 0.003,
+            })
+
+
+def measure(run) -> tuple[float, float, object]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        result = run()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=2_000_000, help="number of log rows")
+    parser.add_argument("--chunksize", type=int, default=250_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, "sensor_monitoring.csv")
+        write_log(file_path, args.n)
+        print(f"{args.n} rows, {os.path.getsize(file_path) / 1e6:.0f} MB")
+
+        modes = {
+            "in-memory": lambda: calculate_events_per_second(file_path),
+            "streaming": lambda: calculate_events_per_second_streaming(file_path, chunksize=args.chunksize),
+        }
+        results = {}
+        print(f"{'mode':<12}{'seconds':>10}{'peak MB':>10}")
+        for name, run in modes.items():
+            elapsed, peak, results[name] = measure(run)
+            print(f"{name:<12}{elapsed:>10.2f}{peak / 1e6:>10.1f}")
+
+        same = results["in-memory"][0]['Events Per Second'].tolist() == results["streaming"][0]['Events Per Second'].tolist()
+        print(f"identical per-second counts: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Compares per-event generate_sample with the vectorized generate_samples.
+
+Run from src/python: python benchmarks/bench_generation.py [-n 200000]
+"""
+import os
+import sys
+import time
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_model import VALID_SENSOR_IDS, generate_sample, generate_samples
+
+
+def per_event_payloads(n: int) -> list:
+    return [
+        json.dumps(generate_sample(sensor_id=VALID_SENSOR_IDS[i % len(VALID_SENSOR_IDS)])[1]).encode("utf-8")
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=200_000, help="number of samples")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    cases = {
+        "generate_sample + json.dumps": lambda: per_event_payloads(args.n),
+        "generate_samples (dicts)": lambda: generate_samples(args.n, seed=args.seed),
+        "generate_samples (bytes)": lambda: generate_samples(args.n, seed=args.seed, as_bytes=True),
+    }
+    print(f"{'case':<32}{'samples/s':>14}")
+    for name, run in cases.items():
+        start = time.perf_counter()
+        run()
+        print(f"{name:<32}{args.n / (time.perf_counter() - start):>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
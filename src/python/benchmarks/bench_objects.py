@@ -0,0 +1,66 @@
+"""Compares construction time, wire round-trip and memory of PackageObj and PackageRecord.
+
+Run from src/python: python benchmarks/bench_objects.py [-n 1000000]
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_model import PackageObj, SensorObj, PackageRecord, SensorRecord
+from serializers import JsonSerializer
+
+DIMENSIONS = {"length": 9.97, "width": 0.97}
+
+
+def build_package_objs(n: int) -> list:
+    return [PackageObj(payload=SensorObj(i % 6 + 1, 985.0, 20.5, DIMENSIONS)) for i in range(n)]
+
+
+def build_package_records(n: int) -> list:
+    return [PackageRecord.new(SensorRecord(i % 6 + 1, 985.0, 20.5, DIMENSIONS)) for i in range(n)]
+
+
+def measure(build, n: int) -> dict:
+    start = time.perf_counter()
+    objs = build(n)
+    elapsed = time.perf_counter() - start
+    del objs
+
+    tracemalloc.start()
+    objs = build(n)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"objs_per_sec": n / elapsed, "bytes_per_obj": memory / n, "objs": objs}
+
+
+def measure_round_trip(objs: list, decode) -> float:
+    serializer = JsonSerializer()
+    wire = [serializer.serialize(obj.to_dict()) for obj in objs]
+    start = time.perf_counter()
+    for data in wire:
+        decode(data)
+    return len(wire) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=1_000_000, help="number of objects to build")
+    args = parser.parse_args()
+
+    representations = {
+        "PackageObj": (build_package_objs, lambda data: PackageObj(**JsonSerializer().deserialize(data))),
+        "PackageRecord": (build_package_records, PackageRecord.from_wire),
+    }
+    print(f"{'representation':<16}{'build/s':>12}{'bytes/obj':>12}{'decode/s':>12}")
+    for name, (build, decode) in representations.items():
+        result = measure(build, args.n)
+        decode_rate = measure_round_trip(result["objs"][:100_000], decode)
+        print(f"{name:<16}{result['objs_per_sec']:>12,.0f}{result['bytes_per_obj']:>12.1f}{decode_rate:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Compares recive_msg_with_logging throughput with a new producer per alert and with a shared one.
+
+Before the shared producer every alert created a KafkaProducer. Here the
+per-alert variant builds (and closes) a real KafkaProducer per alert, pointed at
+an unreachable address so no cluster is needed, and sends through a FakeProducer;
+against a real broker each producer additionally connects and fetches metadata,
+so the measured difference is a lower bound.
+
+Run from src/python: python benchmarks/bench_producer.py [-n 20000]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kafka import KafkaProducer
+from client import recive_msg_with_logging
+from data_model import generate_samples
+from fake_kafka import FakeBroker, FakeConsumer, FakeProducer, StopConsuming
+
+UNREACHABLE: list[str] = ["127.0.0.1:1"]
+
+
+class ProducerPerAlert(FakeProducer):
+    """Creates and closes a KafkaProducer for every send, like the alert path used to."""
+
+    def send(self, *args, **kwargs):
+        producer = KafkaProducer(bootstrap_servers=UNREACHABLE, api_version=(2, 5, 0))
+        producer.close(timeout=0)
+        return super().send(*args, **kwargs)
+
+
+def run(broker: FakeBroker, producer: FakeProducer) -> float:
+    consumer = FakeConsumer(broker, "SENSOR_DATA")
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        try:
+            recive_msg_with_logging(consumer, base_dir=tmp, producer=producer)
+        except StopConsuming:
+            pass
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=20_000, help="number of consumed records")
+    args = parser.parse_args()
+
+    broker = FakeBroker()
+    for sensor_id, value in generate_samples(args.n, seed=1, as_bytes=True):
+        broker.append("SENSOR_DATA", value, key=str(sensor_id).encode("utf-8"))
+
+    print(f"{'producer':<12}{'records/s':>12}{'us/record':>12}{'alerts':>10}")
+    for name, producer in [("per alert", ProducerPerAlert()), ("shared", FakeProducer())]:
+        elapsed = run(broker, producer)
+        alerts = sum(len(records) for records in producer.broker.topics.get("ALERT", []))
+        print(f"{name:<12}{args.n / elapsed:>12,.0f}{elapsed / args.n * 1e6:>12,.1f}{alerts:>10}")
+
+
+if __name__ == "__main__":
+    main()
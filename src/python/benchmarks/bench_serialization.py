@@ -0,0 +1,51 @@
+"""Compares bytes/message and encode/decode time of the JSON and Avro wire formats.
+
+Run from src/python: python benchmarks/bench_serialization.py [-n 20000]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_model import generate_sample
+from serializers import JsonSerializer, AvroSerializer, LocalSchemaRegistry
+
+
+def bench_serializer(serializer, samples: list[dict]) -> dict:
+    start = time.perf_counter()
+    encoded = [serializer.serialize(sample) for sample in samples]
+    encode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for data in encoded:
+        serializer.deserialize(data)
+    decode_time = time.perf_counter() - start
+
+    n = len(samples)
+    return {
+        "bytes_per_msg": sum(len(data) for data in encoded) / n,
+        "encode_us": encode_time / n * 1e6,
+        "decode_us": decode_time / n * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=20000, help="number of messages")
+    args = parser.parse_args()
+
+    samples = [generate_sample(sensor_id=i % 6 + 1)[1] for i in range(args.n)]
+    serializers = {
+        "json": JsonSerializer(),
+        "avro": AvroSerializer(registry=LocalSchemaRegistry()),
+    }
+    print(f"{'format':<8}{'bytes/msg':>12}{'encode µs':>12}{'decode µs':>12}")
+    for name, serializer in serializers.items():
+        result = bench_serializer(serializer, samples)
+        print(f"{name:<8}{result['bytes_per_msg']:>12.1f}{result['encode_us']:>12.2f}{result['decode_us']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
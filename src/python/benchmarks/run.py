@@ -0,0 +1,280 @@
+"""Runs the micro and macro benchmarks of the ingest pipeline and compares them with a baseline.
+
+Micro benchmarks time the per-message building blocks; macro benchmarks run the
+consumers end to end against the in-memory broker of fake_kafka, so no Kafka
+cluster is needed. Each benchmark reports the median of --repeat runs and their
+noise, the median absolute deviation as a fraction of the median. Results are
+written as JSON with --output; with a baseline (benchmarks/baseline.json by
+default) a benchmark slower than its baseline by more than --tolerance plus the
+noise of both measurements is measured again, and reported as a regression, with
+exit status 1, only if it is still that slow.
+
+Run from src/python: python benchmarks/run.py [-n 100000] [--output results.json] [--save-baseline]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client import recive_msg_with_logging, recive_msg_batch, detect_anomalies, save_to_csv, serialize_non_json
+from async_pipeline import recive_msg_async
+from data_model import PackageObj, SensorObj, clean_dimensions, generate_samples
+from fake_kafka import FakeBroker, FakeConsumer, FakeProducer, StopConsuming
+from serializers import JsonSerializer
+from sinks import CsvSink
+
+BASELINE_PATH: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_TOLERANCE: float = 0.2
+DEFAULT_REPEAT: int = 5
+# Macro benchmarks consume n / MACRO_SCALE records, as they are far slower per record
+MACRO_SCALE: int = 5
+
+DIMENSIONS = {"length": 9.97, "width": 0.97}
+DIMENSIONS_JSON = json.dumps(DIMENSIONS)
+
+
+def _samples(n: int) -> list[dict]:
+    return [value for _, value in generate_samples(n, seed=1)]
+
+
+def _packages(n: int) -> list[PackageObj]:
+    return [PackageObj(**value) for value in _samples(n)]
+
+
+def _broker(n: int) -> FakeBroker:
+    broker = FakeBroker()
+    for sensor_id, value in generate_samples(n, seed=1, as_bytes=True):
+        broker.append("SENSOR_DATA", value, key=str(sensor_id).encode("utf-8"))
+    return broker
+
+
+# Every benchmark prepares its input for n operations and returns a function running them
+
+def bench_package_obj(n: int):
+    def run():
+        for i in range(n):
+            PackageObj(payload=SensorObj(i % 6 + 1, 985.0, 20.5, DIMENSIONS))
+    return run
+
+
+def bench_json_round_trip(n: int):
+    packages = _packages(n)
+    serializer = JsonSerializer()
+
+    def run():
+        for package in packages:
+            PackageObj(**serializer.deserialize(serializer.serialize(package.to_dict())))
+    return run
+
+
+def bench_alert_payload(n: int):
+    packages = _packages(n)
+
+    def run():
+        for package in packages:
+            json.loads(json.dumps(package, default=serialize_non_json))
+    return run
+
+
+def bench_detect_anomalies(n: int):
+    packages = _packages(n)
+
+    def run():
+        for package in packages:
+            detect_anomalies(package)
+    return run
+
+
+def bench_save_to_csv(n: int):
+    rows = [{
+        'Sensor ID': package.payload.sensor_id,
+        'Correlation ID': package.correlation_id,
+        'Created At': package.created_at,
+        'Consumed At': package.created_at,
+        'Time Difference (seconds)': 0.0,
+    } for package in _packages(n)]
+
+    def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            file_path = os.path.join(tmp, "log.csv")
+            for row in rows:
+                save_to_csv(file_path, [row])
+    return run
+
+
+def bench_csv_sink(n: int):
+    rows = [{
+        'Sensor ID': package.payload.sensor_id,
+        'Correlation ID': package.correlation_id,
+        'Created At': package.created_at,
+        'Consumed At': package.created_at,
+        'Time Difference (seconds)': 0.0,
+    } for package in _packages(n)]
+
+    def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            with CsvSink(os.path.join(tmp, "log.csv")) as sink:
+                for row in rows:
+                    sink.write(row)
+    return run
+
+
+def bench_clean_dimensions(n: int):
+    def run():
+        for _ in range(n):
+            clean_dimensions(DIMENSIONS_JSON)
+    return run
+
+
+def _consume(recive, n: int, **kwargs):
+    broker = _broker(n)
+
+    def run():
+        consumer = FakeConsumer(broker, "SENSOR_DATA")
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                recive(consumer, base_dir=tmp, producer=FakeProducer(), **kwargs)
+            except StopConsuming:
+                pass
+    return run
+
+
+def bench_consume_sync(n: int):
+    return _consume(recive_msg_with_logging, n)
+
+
+def bench_consume_batch(n: int):
+    return _consume(recive_msg_batch, n, batch_size=500, alert_topic="ALERT")
+
+
+def bench_consume_async(n: int):
+    return _consume(recive_msg_async, n)
+
+
+def bench_produce(n: int):
+    samples = _samples(n)
+    serializer = JsonSerializer()
+
+    def run():
+        producer = FakeProducer()
+        for value in samples:
+            producer.send("SENSOR_DATA", key=str(value["payload"]["sensor_id"]).encode("utf-8"),
+                          value=serializer.serialize(value))
+    return run
+
+
+MICRO_BENCHMARKS = {
+    "package_obj": bench_package_obj,
+    "json_round_trip": bench_json_round_trip,
+    "alert_payload": bench_alert_payload,
+    "detect_anomalies": bench_detect_anomalies,
+    "save_to_csv": bench_save_to_csv,
+    "csv_sink": bench_csv_sink,
+    "clean_dimensions": bench_clean_dimensions,
+}
+MACRO_BENCHMARKS = {
+    "produce": bench_produce,
+    "consume_sync": bench_consume_sync,
+    "consume_batch": bench_consume_batch,
+    "consume_async": bench_consume_async,
+}
+
+
+def measure(bench, n: int, repeat: int) -> dict:
+    run = bench(n)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    noise = statistics.median(abs(elapsed - median) for elapsed in times) / median
+    return {"n": n, "ops_per_sec": n / median, "ns_per_op": median / n * 1e9, "noise": noise}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Returns the names of the benchmarks slower than the baseline by more than `tolerance` plus their noise.
+
+    Baselines saved before the noise was recorded count as noiseless.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        allowed = tolerance + result.get("noise", 0.0) + reference.get("noise", 0.0)
+        if result["ops_per_sec"] < reference["ops_per_sec"] * (1 - allowed):
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=100_000, help="operations per micro benchmark")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="runs per benchmark, the median counts")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="JSON results to compare with")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown against the baseline, as a fraction")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+
+    benchmarks = {name: (bench, args.n) for name, bench in MICRO_BENCHMARKS.items()}
+    benchmarks.update((name, (bench, max(args.n // MACRO_SCALE, 1))) for name, bench in MACRO_BENCHMARKS.items())
+    results = {}
+    print(f"{'benchmark':<20}{'ops/s':>14}{'ns/op':>12}{'noise':>8}{'vs baseline':>13}")
+    for name, (bench, n) in benchmarks.items():
+        if args.filter not in name:
+            continue
+        results[name] = measure(bench, n, args.repeat)
+        _print_result(name, results[name], baseline.get(name))
+
+    # A single slow measurement is often a busy machine, so suspected regressions are measured again
+    suspects = compare(results, baseline, args.tolerance)
+    if suspects:
+        print(f"Measuring again: {', '.join(suspects)}")
+        for name in suspects:
+            bench, n = benchmarks[name]
+            results[name] = measure(bench, n, args.repeat)
+            _print_result(name, results[name], baseline.get(name))
+
+    report = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    for path in filter(None, [args.output, args.baseline if args.save_baseline else None]):
+        with open(path, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Wrote {path}")
+
+    regressions = compare({name: results[name] for name in suspects}, baseline, args.tolerance)
+    if regressions:
+        print(f"Regressions beyond {args.tolerance:.0%} plus noise: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+def _print_result(name: str, result: dict, reference: dict = None) -> None:
+    change = f"{result['ops_per_sec'] / reference['ops_per_sec'] - 1:+.1%}" if reference else "-"
+    print(f"{name:<20}{result['ops_per_sec']:>14,.0f}{result['ns_per_op']:>12,.0f}{result['noise']:>8.1%}{change:>13}")
+
+
+if __name__ == "__main__":
+    main()
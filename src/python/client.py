@@ -1,8 +1,15 @@
 import json
 
-from data_model import PackageObj, generate_sample
+from data_model import PackageObj, generate_sample, to_timestamp
+from sinks import CsvSink
+from serializers import JsonSerializer
+from latency import LatencyTracker
+from clock import now_ns, ns_to_wire_timestamp
 from kafka import KafkaConsumer, KafkaProducer
 from datetime import datetime
+import numpy as np
+import threading
+import atexit
 import os
 import csv
 
@@ -13,64 +20,211 @@ KAFKA_BOOTSTRAP: list[str] = ["kafka:9092"]
 
 DEFAULT_ENCODING: str = "utf-8"
 DEFAULT_CONSUMER: str = "DEFAULT_CONSUMER"
+DEFAULT_BATCH_SIZE: int = 500
 
+# Normal operating ranges, see detect_anomalies
+PRESSURE_RANGE: tuple[float, float] = (980, 990)
+TEMPERATURE_RANGE: tuple[float, float] = (20, 21)
 
-def get_producer() -> KafkaProducer:
-    return KafkaProducer(bootstrap_servers=KAFKA_BOOTSTRAP)
+# Producer batching settings, overridable per call through get_producer(**config)
+PRODUCER_LINGER_MS: int = int(os.environ.get("PRODUCER_LINGER_MS", 5))
+PRODUCER_BATCH_SIZE: int = int(os.environ.get("PRODUCER_BATCH_SIZE", 64 * 1024))
+PRODUCER_COMPRESSION: str = os.environ.get("PRODUCER_COMPRESSION") or None  # gzip, snappy, lz4 or zstd
+PRODUCER_CLOSE_TIMEOUT: float = 10.0
 
+# Wire format used when no serializer is passed, see serializers.get_serializer
+DEFAULT_SERIALIZER = JsonSerializer()
 
-def get_consumer(topic: str, group_id: str = None) -> KafkaConsumer:
+# Kafka header of a forwarded alert, repeated once per anomaly reason, see send_raw
+ANOMALY_HEADER: str = "anomaly"
+
+_producers: dict[str, KafkaProducer] = {}
+_producers_lock = threading.Lock()
+
+
+def get_producer(**config) -> KafkaProducer:
+    """Creates a new producer. Use get_shared_producer on hot paths."""
+    settings = {
+        "linger_ms": PRODUCER_LINGER_MS,
+        "batch_size": PRODUCER_BATCH_SIZE,
+        "compression_type": PRODUCER_COMPRESSION,
+    }
+    settings.update(config)
+    return KafkaProducer(bootstrap_servers=KAFKA_BOOTSTRAP, **settings)
+
+
+def get_shared_producer(name: str = "default", **config) -> KafkaProducer:
+    """Returns the process-wide producer registered under `name`, creating it on first use.
+
+    KafkaProducer is thread safe, so a single instance (one connection pool and one
+    sender thread) can be shared by every thread in the process. `config` is only
+    applied when the producer is created.
+    """
+    with _producers_lock:
+        producer = _producers.get(name)
+        if producer is None:
+            producer = get_producer(**config)
+            _producers[name] = producer
+        return producer
+
+
+def close_producers(timeout: float = PRODUCER_CLOSE_TIMEOUT) -> None:
+    """Flushes and closes every shared producer. Registered to run on interpreter exit."""
+    with _producers_lock:
+        producers = list(_producers.values())
+        _producers.clear()
+    for producer in producers:
+        try:
+            producer.flush(timeout=timeout)
+        finally:
+            producer.close(timeout=timeout)
+
+
+atexit.register(close_producers)
+
+
+def get_consumer(topic: str, group_id: str = None, **config) -> KafkaConsumer:
     if group_id is None:
         group_id = DEFAULT_CONSUMER
-    return KafkaConsumer(topic, bootstrap_servers=KAFKA_BOOTSTRAP, group_id=group_id)
+    return KafkaConsumer(topic, bootstrap_servers=KAFKA_BOOTSTRAP, group_id=group_id, **config)
 
 
-def send_msg(value, key: str, topic: str, producer: KafkaProducer) -> None:
+def send_msg(value, key: str, topic: str, producer: KafkaProducer, serializer=None) -> None:
+    if serializer is None:
+        serializer = DEFAULT_SERIALIZER
     producer.send(
         topic=topic,
         key=key.encode(DEFAULT_ENCODING),
-        value=json.dumps(value).encode(DEFAULT_ENCODING),
+        value=serializer.serialize(value),
     )
 
 
-def produce_msg(sensor_id: int, topic: str, producer: KafkaProducer) -> None:
-    key, value = generate_sample(sensor_id=sensor_id)
+def send_raw(value: bytes, key: bytes, topic: str, producer: KafkaProducer, anomalies=()) -> None:
+    """Publishes already encoded record bytes unchanged, with the anomaly reasons as headers."""
+    producer.send(
+        topic=topic,
+        key=key,
+        value=value,
+        headers=[(ANOMALY_HEADER, anomaly.encode(DEFAULT_ENCODING)) for anomaly in anomalies],
+    )
+
+
+def get_anomalies(msg) -> list[str]:
+    """Returns the anomaly reasons of an alert forwarded with send_raw."""
+    return [value.decode(DEFAULT_ENCODING) for name, value in msg.headers or () if name == ANOMALY_HEADER]
+
+
+def produce_msg(sensor_id: int, topic: str, producer: KafkaProducer = None, serializer=None,
+                timestamp_ns: bool = False) -> None:
+    if producer is None:
+        producer = get_shared_producer()
+    key, value = generate_sample(sensor_id=sensor_id, timestamp_ns=timestamp_ns)
     print(f"Produced: {value}")
-    send_msg(key=str(key), value=value, topic=topic, producer=producer)
+    send_msg(key=str(key), value=value, topic=topic, producer=producer, serializer=serializer)
+
 
+def recive_msg_with_logging(consumer, base_dir="logs", sink: CsvSink = None, serializer=None,
+                            latency: LatencyTracker = None, producer: KafkaProducer = None, detector=None,
+                            suppressor=None, profiler=None, raw_alerts: bool = False, dedup=None):
+    """Consumes messages, detects anomalies, and logs them.
 
-def recive_msg_with_logging(consumer, base_dir="logs"):
-    """Consumes messages, detects anomalies, and logs them."""
+    `detector` is an object with a check(package) method, such as
+    detection.AnomalyDetector, used instead of detect_anomalies.
+    `suppressor` is a suppression.AlertSuppressor; with it, alerts are coalesced per
+    sensor and anomaly type and published once per window instead of per message.
+    `profiler` is a profiling.StageProfiler timing the stages of sampled messages.
+    With `raw_alerts` an alert is the consumed record itself, forwarded with
+    send_raw, instead of the package encoded again (coalesced alerts excepted).
+    `dedup` is a dedup.Deduplicator; records whose correlation_id it has seen are
+    skipped, and when due it is checkpointed and the offsets committed, so the
+    consumer must not auto-commit.
+    """
+    if producer is None:
+        producer = get_shared_producer()
+    if serializer is None:
+        serializer = DEFAULT_SERIALIZER
+    if sink is None:
+        sink = CsvSink(os.path.join(base_dir, "sensor_monitoring.csv"))
     try:
         os.makedirs(base_dir, exist_ok=True)  # Ensure the directory exists
+        laps = profiler.start() if profiler is not None else None
         for msg in consumer:
-            package = PackageObj(**json.loads(msg.value.decode('utf-8')))
-            consumed_at = datetime.utcnow()
-            time_diff = (consumed_at - package.created_at).total_seconds()
+            if laps is not None:
+                laps.lap("fetch")
+            data = serializer.deserialize(msg.value)
+            if laps is not None:
+                laps.lap("decode")
+            if dedup is not None and dedup.seen(data["correlation_id"]):
+                laps = profiler.start() if profiler is not None else None
+                continue
+            package = PackageObj(**data)
+            if laps is not None:
+                laps.lap("build")
+            created_at, consumed_at, time_diff = get_timestamps(package)
+            if latency is not None:
+                latency.record(msg.topic, package.payload.sensor_id, time_diff)
             
-            anomalies = detect_anomalies(package)
-            if anomalies:
+            anomalies = detector.check(package) if detector is not None else detect_anomalies(package)
+            if laps is not None:
+                laps.lap("detect")
+            if suppressor is not None:
+                for key, value in suppressor.offer(package, anomalies):
+                    send_msg(key=key, value=value, topic="ALERT", producer=producer, serializer=serializer)
+            elif anomalies and raw_alerts:
+                send_raw(msg.value, msg.key, "ALERT", producer, anomalies)
+            elif anomalies:
                 # Serialize the package object to JSON format with custom datetime handling
                 send_msg(
                     key=str(package.payload.sensor_id),
                     value=json.loads(json.dumps(package, default=serialize_non_json)),
                     topic="ALERT",
-                    producer=get_producer()
+                    producer=producer,
+                    serializer=serializer,
                 )
+            if laps is not None:
+                laps.lap("alert")
             
             # Log normal message data
-            data_to_save = [{
+            sink.write({
                 'Sensor ID': package.payload.sensor_id,
                 'Correlation ID': package.correlation_id,
-                'Created At': package.created_at,
+                'Created At': created_at,
                 'Consumed At': consumed_at,
                 'Time Difference (seconds)': time_diff
-            }]
-            topic_file = os.path.join(base_dir, "sensor_monitoring.csv")
-            save_to_csv(topic_file, data_to_save)
+            })
+            if laps is not None:
+                laps.lap("write")
+            if dedup is not None and dedup.checkpoint_due():
+                sink.flush()  # Rows before the committed offsets must not be lost
+                dedup.checkpoint(consumer)
+            laps = profiler.start() if profiler is not None else None
         
     except Exception as e:
         print(f"Error consuming messages: {e}")
+    finally:
+        sink.close()  # Also runs on KeyboardInterrupt so buffered rows are not lost
+        if profiler is not None:
+            profiler.close()
+        if dedup is not None:
+            _close_dedup(dedup, consumer)
+        if suppressor is not None:
+            # Publish the windows still open, so their alerts are not lost
+            for key, value in suppressor.flush():
+                send_msg(key=key, value=value, topic="ALERT", producer=producer, serializer=serializer)
+            suppressor.report()
+
+
+def get_timestamps(package: PackageObj) -> tuple:
+    """Returns (created at, consumed at, latency in seconds) of a consumed package.
+
+    Packages with created_at_ns are timed with clock.now_ns and their timestamps
+    are returned as integer nanoseconds, so no datetime is built per message.
+    """
+    if package.created_at_ns is not None:
+        consumed_at = now_ns()
+        return package.created_at_ns, consumed_at, (consumed_at - package.created_at_ns) / 1e9
+    consumed_at = datetime.utcnow()
+    return package.created_at, consumed_at, (consumed_at - package.created_at).total_seconds()
 
 
 def serialize_non_json(obj):
@@ -85,56 +239,259 @@ def serialize_non_json(obj):
 def detect_anomalies(package: PackageObj):
     """Tjekker for afvigelser i sensorens målinger."""
     anomalies = []
-    if not (980 <= package.payload.pressure <= 990):  # Normalt trykområde
+    if not (PRESSURE_RANGE[0] <= package.payload.pressure <= PRESSURE_RANGE[1]):  # Normalt trykområde
         anomalies.append(f"Trykafvigelse: {package.payload.pressure}")
-    if not (20 <= package.payload.temperature <= 21):  # Normal temperatur
+    if not (TEMPERATURE_RANGE[0] <= package.payload.temperature <= TEMPERATURE_RANGE[1]):  # Normal temperatur
         anomalies.append(f"Temperaturafvigelse: {package.payload.temperature}")
     return anomalies
 
 
+def decode_batch(records, serializer=None) -> dict[str, np.ndarray]:
+    """Decodes a batch of records into columnar arrays without building PackageObj instances.
+
+    "created_at" holds the wire created_at timestamps (see clock.wire_timestamp), or
+    NaN for records with created_at_ns; "created_at_ns" holds the wire created_at_ns,
+    or -1 for records without it. The two are on different clocks, see recive_msg_batch.
+    """
+    if serializer is None:
+        serializer = DEFAULT_SERIALIZER
+    n = len(records)
+    columns = {
+        "sensor_id": np.empty(n, dtype=np.int64),
+        "pressure": np.empty(n, dtype=np.float64),
+        "temperature": np.empty(n, dtype=np.float64),
+        "created_at": np.empty(n, dtype=np.float64),
+        "created_at_ns": np.empty(n, dtype=np.int64),
+    }
+    correlation_ids = []
+    for i, record in enumerate(records):
+        data = serializer.deserialize(record.value)
+        payload = data["payload"]
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+        columns["sensor_id"][i] = int(payload["sensor_id"])
+        columns["pressure"][i] = payload["pressure"]
+        columns["temperature"][i] = payload["temperature"]
+        created_at_ns = data.get("created_at_ns")
+        if created_at_ns is not None:
+            columns["created_at_ns"][i] = created_at_ns
+            columns["created_at"][i] = np.nan
+        else:
+            columns["created_at_ns"][i] = -1
+            columns["created_at"][i] = to_timestamp(data["created_at"])
+        correlation_ids.append(data["correlation_id"])
+    columns["correlation_id"] = np.array(correlation_ids, dtype=object)
+    return columns
+
+
+def batch_anomalies(columns: dict[str, np.ndarray], pressure_anomaly: np.ndarray,
+                    temperature_anomaly: np.ndarray) -> list[tuple[int, list[str]]]:
+    """Returns (index, anomalies) of the anomalous records, with the same reasons as detect_anomalies."""
+    alerts = []
+    for i in np.flatnonzero(pressure_anomaly | temperature_anomaly).tolist():
+        anomalies = []
+        if pressure_anomaly[i]:
+            anomalies.append(f"Trykafvigelse: {columns['pressure'][i].item()}")
+        if temperature_anomaly[i]:
+            anomalies.append(f"Temperaturafvigelse: {columns['temperature'][i].item()}")
+        alerts.append((i, anomalies))
+    return alerts
+
+
+def detect_anomalies_batch(columns: dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """Vectorized detect_anomalies. Returns the pressure and temperature anomaly masks."""
+    pressure, temperature = columns["pressure"], columns["temperature"]
+    pressure_anomaly = (pressure < PRESSURE_RANGE[0]) | (pressure > PRESSURE_RANGE[1])
+    temperature_anomaly = (temperature < TEMPERATURE_RANGE[0]) | (temperature > TEMPERATURE_RANGE[1])
+    return pressure_anomaly, temperature_anomaly
+
+
+def recive_msg_batch(
+        consumer,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        base_dir="logs",
+        file_name: str = "sensor_monitoring.csv",
+        alert_topic: str = None,
+        sink: CsvSink = None,
+        timeout_ms: int = 1000,
+        serializer=None,
+        latency: LatencyTracker = None,
+        producer: KafkaProducer = None,
+        detector=None,
+        profiler=None,
+):
+    """Consumes messages in batches of up to `batch_size` records and logs them.
+
+    When `alert_topic` is set, anomalous records are forwarded to it unchanged with
+    send_raw, with their anomalies as headers. Offsets are
+    committed after each batch, so the consumer should be created with
+    enable_auto_commit=False. `profiler` times the stages of sampled batches.
+    """
+    if sink is None:
+        sink = CsvSink(os.path.join(base_dir, file_name), flush_rows=max(batch_size, 1000))
+    if producer is None and alert_topic:
+        producer = get_shared_producer()
+    try:
+        os.makedirs(base_dir, exist_ok=True)  # Ensure the directory exists
+        while True:
+            laps = profiler.start() if profiler is not None else None
+            batches = consumer.poll(timeout_ms=timeout_ms, max_records=batch_size)
+            records = [record for partition in batches.values() for record in partition]
+            if not records:
+                continue
+            if laps is not None:
+                laps.lap("fetch")
+
+            columns = decode_batch(records, serializer=serializer)
+            if laps is not None:
+                laps.lap("decode")
+            created_ns = columns["created_at_ns"] >= 0
+            if created_ns.all():
+                # Timestamps stay integer nanoseconds, see get_timestamps
+                consumed_at = now_ns()
+                time_diff = (consumed_at - columns["created_at_ns"]) / 1e9
+                created_at = columns["created_at_ns"].tolist()
+            else:
+                # created_at_ns is true UNIX time, so mixed in records are moved onto the wire timestamp scale
+                columns["created_at"][created_ns] = [
+                    ns_to_wire_timestamp(ns) for ns in columns["created_at_ns"][created_ns].tolist()
+                ]
+                consumed_at = datetime.utcnow()
+                time_diff = consumed_at.timestamp() - columns["created_at"]
+                created_at = [datetime.fromtimestamp(timestamp) for timestamp in columns["created_at"].tolist()]
+            if latency is not None:
+                latency.record_many(records[0].topic, columns["sensor_id"].tolist(), time_diff.tolist())
+
+            if alert_topic:
+                if detector is not None:
+                    # Stateful detectors see the samples one at a time, in order
+                    alerts = [
+                        (i, anomalies) for i, anomalies in enumerate(
+                            detector.check_values(*values) for values in zip(
+                                columns["sensor_id"].tolist(), columns["pressure"].tolist(),
+                                columns["temperature"].tolist(),
+                            )
+                        )
+                        if anomalies
+                    ]
+                else:
+                    alerts = batch_anomalies(columns, *detect_anomalies_batch(columns))
+                for i, anomalies in alerts:
+                    send_raw(records[i].value, records[i].key, alert_topic, producer, anomalies)
+            if laps is not None:
+                laps.lap("detect_alert")
+
+            sink.write_rows([
+                {
+                    'Sensor ID': sensor_id,
+                    'Correlation ID': correlation_id,
+                    'Created At': created,
+                    'Consumed At': consumed_at,
+                    'Time Difference (seconds)': diff,
+                }
+                for sensor_id, correlation_id, created, diff in zip(
+                    columns["sensor_id"].tolist(),
+                    columns["correlation_id"],
+                    created_at,
+                    time_diff.tolist(),
+                )
+            ])
+            if laps is not None:
+                laps.lap("write")
+            consumer.commit()
+            if laps is not None:
+                laps.lap("commit")
+
+    except Exception as e:
+        print(f"Error consuming messages: {e}")
+    finally:
+        sink.close()
+        if profiler is not None:
+            profiler.close()
+
+
 from datetime import datetime
 
-def recive_msg(consumer, base_dir="logs"):
-    """Consumes messages and saves them to topic-specific CSV files."""
+def recive_msg(consumer, base_dir="logs", sink: CsvSink = None, serializer=None,
+               latency: LatencyTracker = None, profiler=None, dedup=None):
+    """Consumes messages and saves them to topic-specific CSV files.
+
+    `profiler` is a profiling.StageProfiler timing the stages of sampled messages.
+    `dedup` is a dedup.Deduplicator, see recive_msg_with_logging. A coalesced alert
+    carries the correlation_id of the first package of its window, which can open
+    a window per anomaly type, so these are deduplicated per anomaly type.
+    """
+    if serializer is None:
+        serializer = DEFAULT_SERIALIZER
+    if sink is None:
+        sink = CsvSink(os.path.join(base_dir, "alert.csv"))
     try:
         os.makedirs(base_dir, exist_ok=True)  # Ensure the directory exists
+        laps = profiler.start() if profiler is not None else None
         for msg in consumer:
+            if laps is not None:
+                laps.lap("fetch")
             # Deserialize the message
-            package_data = json.loads(msg.value.decode('utf-8'))
+            package_data = serializer.deserialize(msg.value)
+            summary = package_data.pop('alert_summary', None)  # Added by suppression.AlertSuppressor
+            if laps is not None:
+                laps.lap("decode")
+            dedup_key = package_data["correlation_id"]
+            if summary is not None:
+                dedup_key += ":" + summary["anomaly_type"]
+            if dedup is not None and dedup.seen(dedup_key):
+                laps = profiler.start() if profiler is not None else None
+                continue
 
-            # Ensure `created_at` is a datetime object
-            if isinstance(package_data['created_at'], str):
+            # ALERT payloads carry created_at as an ISO string; UNIX timestamps and
+            # created_at_ns are handled by PackageObj, as on SENSOR_DATA
+            if isinstance(package_data.get('created_at'), str):
                 package_data['created_at'] = datetime.fromisoformat(package_data['created_at'])
-            elif isinstance(package_data['created_at'], (int, float)):
-                # Convert Unix timestamp to datetime
-                package_data['created_at'] = datetime.utcfromtimestamp(package_data['created_at'])
-            elif not isinstance(package_data['created_at'], datetime):
-                raise ValueError(f"Unexpected type for 'created_at': {type(package_data['created_at'])}")
 
             package = PackageObj(**package_data)
+            if laps is not None:
+                laps.lap("build")
+            created_at, consumed_at, time_diff = get_timestamps(package)
+            if latency is not None:
+                latency.record(msg.topic, package.payload.sensor_id, time_diff)
 
-            consumed_at = datetime.utcnow()
-            time_diff = (consumed_at - package.created_at).total_seconds()
-
-            data_to_save = [{
+            sink.write({
                 'Sensor ID': package.payload.sensor_id,
                 'Correlation ID': package.correlation_id,
-                'Created At': package.created_at,
+                'Created At': created_at,
                 'Consumed At': consumed_at,
                 'Time Difference (seconds)': time_diff
-            }]
-
-            # Create file path for the topic
-            topic_file = os.path.join(base_dir, "alert.csv")
-            save_to_csv(topic_file, data_to_save)
+            })
+            if laps is not None:
+                laps.lap("write")
+            if dedup is not None and dedup.checkpoint_due():
+                sink.flush()
+                dedup.checkpoint(consumer)
+            laps = profiler.start() if profiler is not None else None
 
     except Exception as e:
         print(f"Error consuming messages: {e}")
+    finally:
+        sink.close()
+        if profiler is not None:
+            profiler.close()
+        if dedup is not None:
+            _close_dedup(dedup, consumer)
+
+
+def _close_dedup(dedup, consumer) -> None:
+    """Takes a last dedup checkpoint, once the sink is closed, and prints the dedup report."""
+    if dedup.checkpoint_path is not None:
+        try:
+            dedup.checkpoint(consumer)
+        except Exception as e:
+            print(f"Error saving dedup checkpoint: {e}")
+    dedup.report()
 
 
 
 def save_to_csv(file_path: str, data: list[dict]):
-    """Save data to a CSV file."""
+    """Save data to a CSV file. Prefer CsvSink for per-message logging."""
     file_exists = os.path.exists(file_path)
     with open(file_path, mode='a', newline='') as file:
         writer = csv.DictWriter(file, fieldnames=data[0].keys())
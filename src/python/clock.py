@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+import time
+
+# Version of PackageObj that carries `created_at_ns` instead of `created_at`
+NS_SCHEMA_VERSION: int = 2
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Wall clock time at perf_counter_ns() == 0, see now_ns
+_offset_ns: int = time.time_ns() - time.perf_counter_ns()
+
+
+def resync() -> None:
+    """Re-anchors now_ns to the wall clock, e.g. after an NTP step in a long running process."""
+    global _offset_ns
+    _offset_ns = time.time_ns() - time.perf_counter_ns()
+
+
+def now_ns() -> int:
+    """UNIX time in integer nanoseconds from the monotonic clock.
+
+    The wall clock is read once, so timestamps taken in one process never go
+    backwards and their differences are exact; across hosts they are as close as
+    the hosts' clocks were when the processes started.
+    """
+    return time.perf_counter_ns() + _offset_ns
+
+
+def wire_timestamp() -> float:
+    """`created_at` as PackageObj puts it on the wire: the naive UTC now read by .timestamp().
+
+    Consumers turn it back into the naive UTC datetime with datetime.fromtimestamp,
+    so it must be stamped this way rather than with time.time() outside UTC.
+    """
+    return datetime.utcnow().timestamp()
+
+
+def ns_to_wire_timestamp(ns: int) -> float:
+    """A nanosecond timestamp on the scale of wire_timestamp, to compare or mix it with wire created_at values."""
+    return ns_to_datetime(ns).timestamp()
+
+
+def ns_to_datetime(ns: int) -> datetime:
+    """Naive UTC datetime of a nanosecond timestamp, truncated to microseconds."""
+    return _EPOCH + timedelta(microseconds=ns // 1000)
+
+
+def datetime_to_ns(value: datetime) -> int:
+    """Nanosecond timestamp of a naive UTC datetime."""
+    delta = value - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1000
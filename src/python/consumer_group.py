@@ -0,0 +1,215 @@
+from client import (
+    KAFKA_BOOTSTRAP,
+    DEFAULT_CONSUMER,
+    get_consumer,
+    close_producers,
+    recive_msg_with_logging,
+    recive_msg_batch,
+)
+from serializers import get_serializer
+from latency import LatencyTracker
+from sinks import IN_PROGRESS_PREFIX, get_sink
+from kafka import KafkaConsumer
+import multiprocessing as mp
+import argparse
+import signal
+import queue
+import glob
+import time
+import os
+
+REPORT_INTERVAL: float = 5.0
+RESTART_DELAY: float = 1.0
+# Seconds the workers get to flush their sinks and producers on shutdown
+SHUTDOWN_TIMEOUT: float = 10.0
+
+
+def count_partitions(topic: str) -> int:
+    """Returns the number of partitions of `topic` (1 if the topic is unknown)."""
+    consumer = KafkaConsumer(bootstrap_servers=KAFKA_BOOTSTRAP)
+    try:
+        return len(consumer.partitions_for_topic(topic) or {0})
+    finally:
+        consumer.close()
+
+
+class ProgressConsumer:
+    """Wraps a KafkaConsumer and periodically reports throughput and lag to a queue."""
+
+    def __init__(self, consumer: KafkaConsumer, worker_id: int, stats_queue, report_interval: float = REPORT_INTERVAL):
+        self.consumer = consumer
+        self.worker_id = worker_id
+        self.stats_queue = stats_queue
+        self.report_interval = report_interval
+        self._count = 0
+        self._last_count = 0
+        self._last_report = time.monotonic()
+
+    def __iter__(self):
+        for msg in self.consumer:
+            yield msg
+            self._count += 1
+            self._maybe_report()
+
+    def poll(self, *args, **kwargs):
+        batches = self.consumer.poll(*args, **kwargs)
+        self._count += sum(len(records) for records in batches.values())
+        self._maybe_report()
+        return batches
+
+    def __getattr__(self, name):
+        return getattr(self.consumer, name)
+
+    def lag(self) -> int:
+        assignment = self.consumer.assignment()
+        if not assignment:
+            return 0
+        end_offsets = self.consumer.end_offsets(list(assignment))
+        return sum(end_offsets[tp] - self.consumer.position(tp) for tp in assignment)
+
+    def _maybe_report(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last_report
+        if elapsed < self.report_interval:
+            return
+        rate = (self._count - self._last_count) / elapsed
+        self.stats_queue.put((self.worker_id, self._count, rate, self.lag()))
+        self._last_count = self._count
+        self._last_report = now
+
+
+def _stop_worker(signum, frame):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)  # A second SIGTERM must not cut the cleanup short
+    raise KeyboardInterrupt
+
+
+def run_worker(worker_id: int, topic: str, group_id: str, base_dir: str, stats_queue,
+               batch_size: int = 0, serializer: str = "json", sink: str = "csv") -> None:
+    """Runs one monitoring consumer, logging to its own directory under `base_dir`.
+
+    SIGTERM stops it like Ctrl-C, running the cleanup below.
+    """
+    signal.signal(signal.SIGTERM, _stop_worker)
+    worker_dir = os.path.join(base_dir, f"worker-{worker_id}")
+    consumer = get_consumer(topic, group_id=group_id, enable_auto_commit=batch_size <= 0)
+    progress = ProgressConsumer(consumer, worker_id, stats_queue)
+    # Snapshots are named by pid, so merge_snapshots can combine all workers
+    latency = LatencyTracker(snapshot_dir=os.path.join(base_dir, "latency"))
+    log_sink = get_sink(sink, worker_dir, "sensor_monitoring")
+    try:
+        if batch_size > 0:
+            recive_msg_batch(progress, batch_size=batch_size, base_dir=worker_dir, alert_topic="ALERT",
+                             sink=log_sink, serializer=get_serializer(serializer), latency=latency)
+        else:
+            recive_msg_with_logging(progress, base_dir=worker_dir, sink=log_sink,
+                                    serializer=get_serializer(serializer), latency=latency)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Worker processes exit without running atexit hooks
+        close_producers()
+        latency.close()
+        consumer.close()
+
+
+def merge_outputs(base_dir: str) -> list[str]:
+    """Appends every worker's CSV files to the file of the same name in `base_dir`.
+
+    Parquet files are self-contained, so they are moved into the directory of the
+    same name in `base_dir`; files a worker did not finish writing are left behind.
+    """
+    merged = []
+    for worker_file in sorted(glob.glob(os.path.join(base_dir, "worker-*", "*", "*.parquet"))):
+        if os.path.basename(worker_file).startswith(IN_PROGRESS_PREFIX):
+            continue
+        target_dir = os.path.join(base_dir, os.path.basename(os.path.dirname(worker_file)))
+        os.makedirs(target_dir, exist_ok=True)
+        os.replace(worker_file, os.path.join(target_dir, os.path.basename(worker_file)))
+        merged.append(target_dir)
+    for worker_file in sorted(glob.glob(os.path.join(base_dir, "worker-*", "*.csv"))):
+        target = os.path.join(base_dir, os.path.basename(worker_file))
+        target_exists = os.path.exists(target) and os.path.getsize(target) > 0
+        with open(worker_file, newline='') as source, open(target, mode='a', newline='') as destination:
+            header = source.readline()
+            if not target_exists:
+                destination.write(header)
+            for chunk in iter(lambda: source.read(1 << 20), ""):
+                destination.write(chunk)
+        os.remove(worker_file)
+        merged.append(target)
+    return sorted(set(merged))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the monitoring consumer as a group of worker processes.")
+    parser.add_argument("group_id", nargs="?", default=DEFAULT_CONSUMER)
+    parser.add_argument("--topic", default="SENSOR_DATA")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of worker processes, capped at the partition count")
+    parser.add_argument("--base-dir", default="logs")
+    parser.add_argument("--batch-size", type=int, default=0)
+    parser.add_argument("--serializer", choices=["json", "avro"], default="json")
+    parser.add_argument("--sink", choices=["csv", "parquet"], default="csv")
+    args = parser.parse_args()
+
+    num_workers = max(1, min(args.workers, count_partitions(args.topic)))
+    print(f"group_id={args.group_id} workers={num_workers}")
+
+    stats_queue = mp.Queue()
+
+    def start_worker(worker_id: int) -> mp.Process:
+        process = mp.Process(
+            target=run_worker,
+            args=(worker_id, args.topic, args.group_id, args.base_dir, stats_queue, args.batch_size, args.serializer,
+                  args.sink),
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    processes = {worker_id: start_worker(worker_id) for worker_id in range(num_workers)}
+    restarts = {worker_id: 0 for worker_id in range(num_workers)}
+    stats = {}
+
+    try:
+        last_report = time.monotonic()
+        while True:
+            try:
+                worker_id, count, rate, lag = stats_queue.get(timeout=RESTART_DELAY)
+                stats[worker_id] = (count, rate, lag)
+            except queue.Empty:
+                pass
+
+            for worker_id, process in processes.items():
+                if not process.is_alive():
+                    print(f"worker {worker_id} exited with code {process.exitcode}, restarting")
+                    restarts[worker_id] += 1
+                    processes[worker_id] = start_worker(worker_id)
+
+            if time.monotonic() - last_report >= REPORT_INTERVAL and stats:
+                for worker_id, (count, rate, lag) in sorted(stats.items()):
+                    print(f"worker {worker_id}: {rate:,.0f} msg/s, {count} consumed, lag {lag}, "
+                          f"restarts {restarts[worker_id]}")
+                print(f"total: {sum(rate for _, rate, _ in stats.values()):,.0f} msg/s, "
+                      f"lag {sum(lag for _, _, lag in stats.values())}")
+                last_report = time.monotonic()
+
+    except KeyboardInterrupt:
+        # On Ctrl-C the workers got the terminal's SIGINT too; give them time to stop on their own
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for process in processes.values():
+            process.join(timeout=max(0.0, deadline - time.monotonic()))
+    finally:
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()  # SIGTERM, which the worker handles like Ctrl-C
+        for process in processes.values():
+            process.join(timeout=SHUTDOWN_TIMEOUT)
+            if process.is_alive():
+                process.kill()
+        for path in merge_outputs(args.base_dir):
+            print(f"Merged worker logs into {path}")
+
+
+if __name__ == "__main__":
+    main()
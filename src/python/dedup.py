@@ -0,0 +1,189 @@
+from hashlib import blake2b
+import struct
+import math
+import json
+import time
+import os
+
+DEFAULT_TTL: float = 600.0
+DEFAULT_GENERATIONS: int = 4
+# Ids per generation before it is rotated early, which bounds the false positive rate
+DEFAULT_CAPACITY: int = 1_000_000
+DEFAULT_FP_RATE: float = 0.001
+DEFAULT_CHECKPOINT_INTERVAL: float = 30.0
+# Bits set per id. Fewer than the memory-optimal ~12 for this rate, as every
+# hash is a Python-level step; the filters are sized up about 20% to compensate.
+HASHES: int = 6
+
+# The bit positions are read straight from the digest
+_POSITIONS = struct.Struct(f"<{HASHES}I")
+
+
+class _Generation:
+    __slots__ = ("bits", "started_at", "count")
+
+    def __init__(self, size: int, started_at: float):
+        self.bits = bytearray(size)
+        self.started_at = started_at
+        self.count = 0
+
+    def ones(self) -> int:
+        return int.from_bytes(self.bits, "little").bit_count()
+
+
+class Deduplicator:
+    """Drops records whose correlation_id was seen within roughly the last `ttl` seconds.
+
+    Ids are kept in `generations` Bloom filters of a fixed size, each covering
+    ttl / generations seconds: ids are added to the newest one and looked up in
+    all of them, and the oldest is cleared and reused when the newest is full
+    (`capacity` ids) or old enough. Memory stays fixed; in exchange a new id is
+    taken for a duplicate, and dropped, with about `fp_rate` probability.
+
+    With a `checkpoint_path` the filters are saved, and then the consumer
+    positions committed, every `checkpoint_interval` seconds; see checkpoint and
+    load. The consumer must not auto-commit, so that every committed offset has
+    the ids before it saved.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, generations: int = DEFAULT_GENERATIONS,
+                 capacity: int = DEFAULT_CAPACITY, fp_rate: float = DEFAULT_FP_RATE,
+                 checkpoint_path: str = None, checkpoint_interval: float = DEFAULT_CHECKPOINT_INTERVAL):
+        self.ttl = ttl
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        # Every generation gets an equal share of the false positive rate; a full one
+        # has (1 - e^(-k n / m))^k false positives for n ids in m bits and k hashes
+        share = fp_rate / generations
+        bits = -HASHES * capacity / math.log(1 - share ** (1 / HASHES))
+        self.size = math.ceil(bits / 8)
+        now = time.time()
+        self._generations = [_Generation(self.size, now) for _ in range(generations)]  # Newest first
+        self._last_checkpoint = time.monotonic()
+        self.checked = 0
+        self.duplicates = 0
+        self.rotations = 0
+        self._spent_ns = 0
+
+    def seen(self, correlation_id: str, now: float = None) -> bool:
+        """Returns True if `correlation_id` was probably seen before, else records it and returns False."""
+        started = time.perf_counter_ns()
+        self.checked += 1
+        m = self.size * 8
+        digest = blake2b(correlation_id.encode("utf-8"), digest_size=_POSITIONS.size).digest()
+        positions = [value % m for value in _POSITIONS.unpack(digest)]
+
+        for generation in self._generations:
+            bits = generation.bits
+            for position in positions:
+                if not bits[position >> 3] & (1 << (position & 7)):
+                    break
+            else:
+                self.duplicates += 1
+                self._spent_ns += time.perf_counter_ns() - started
+                return True
+
+        current = self._generations[0]
+        if now is None:
+            now = time.time()
+        if current.count >= self.capacity or now - current.started_at >= self.ttl / len(self._generations):
+            current = self._rotate(now)
+        bits = current.bits
+        for position in positions:
+            bits[position >> 3] |= 1 << (position & 7)
+        current.count += 1
+        self._spent_ns += time.perf_counter_ns() - started
+        return False
+
+    def _rotate(self, now: float) -> _Generation:
+        generation = self._generations.pop()
+        generation.bits = bytearray(self.size)
+        generation.started_at = now
+        generation.count = 0
+        self._generations.insert(0, generation)
+        self.rotations += 1
+        return generation
+
+    def false_positive_rate(self) -> float:
+        """Estimated chance that a new id is taken for a duplicate, from the bits set."""
+        m = self.size * 8
+        new = 1.0
+        for generation in self._generations:
+            new *= 1 - (generation.ones() / m) ** HASHES
+        return 1 - new
+
+    def checkpoint_due(self) -> bool:
+        return (self.checkpoint_path is not None
+                and time.monotonic() - self._last_checkpoint >= self.checkpoint_interval)
+
+    def checkpoint(self, consumer) -> None:
+        """Saves the filters to checkpoint_path, then commits the consumer's positions.
+
+        Call it between records, after the records before the positions were fully
+        handled. Saving first means a restart resumes from offsets whose ids are
+        all in the saved filters: if the commit is lost, the records since the
+        previous commit are consumed again and dropped as the duplicates they are.
+        """
+        self._last_checkpoint = time.monotonic()
+        self.save(self.checkpoint_path)
+        consumer.commit()
+
+    def save(self, path: str) -> None:
+        """Writes the filters as a JSON header line followed by the filter bits."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        header = {
+            "saved_at": time.time(),
+            "ttl": self.ttl,
+            "capacity": self.capacity,
+            "fp_rate": self.fp_rate,
+            "size": self.size,
+            "hashes": HASHES,
+            "generations": [[g.started_at, g.count] for g in self._generations],
+        }
+        with open(path + ".tmp", "wb") as file:
+            file.write(json.dumps(header).encode("utf-8") + b"\n")
+            for generation in self._generations:
+                file.write(generation.bits)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "Deduplicator":
+        """Restores a Deduplicator saved by save or checkpoint, or returns a new one if `path` does not exist.
+
+        `kwargs` override the saved parameters, but must not change the filter
+        dimensions (capacity, fp_rate and generations).
+        """
+        kwargs.setdefault("checkpoint_path", path)
+        if not os.path.exists(path):
+            return cls(**kwargs)
+        with open(path, "rb") as file:
+            header = json.loads(file.readline())
+            options = dict(ttl=header["ttl"], generations=len(header["generations"]), capacity=header["capacity"],
+                           fp_rate=header["fp_rate"])
+            options.update(kwargs)
+            dedup = cls(**options)
+            if (dedup.size, HASHES, len(dedup._generations)) != (header["size"], header["hashes"],
+                                                                  len(header["generations"])):
+                raise ValueError(f"{path} was saved with different filter dimensions")
+            for generation, (started_at, count) in zip(dedup._generations, header["generations"]):
+                generation.bits = bytearray(file.read(dedup.size))
+                generation.started_at, generation.count = started_at, count
+        return dedup
+
+    def report(self) -> None:
+        stats = self.stats()
+        print(f"Dedup: {stats['checked']} checked, {stats['duplicates']} duplicates dropped, "
+              f"estimated false positive rate {stats['false_positive_rate']:.2e}, "
+              f"{stats['ns_per_message']:.0f}ns per message, {stats['memory_bytes'] / 1e6:.1f}MB")
+
+    def stats(self) -> dict:
+        return {
+            "checked": self.checked,
+            "duplicates": self.duplicates,
+            "rotations": self.rotations,
+            "false_positive_rate": self.false_positive_rate(),
+            "ns_per_message": self._spent_ns / self.checked if self.checked else 0.0,
+            "memory_bytes": self.size * len(self._generations),
+        }
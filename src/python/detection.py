@@ -0,0 +1,125 @@
+from client import PRESSURE_RANGE, TEMPERATURE_RANGE
+from data_model import PackageObj
+import math
+
+DEFAULT_WINDOW: int = 256
+DEFAULT_ALPHA: float = 0.05
+DEFAULT_Z_THRESHOLD: float = 3.0
+# Samples needed before the rolling statistics are trusted
+DEFAULT_MIN_SAMPLES: int = 32
+
+_NO_ANOMALIES: tuple = ()
+
+
+class RollingStats:
+    """Mean and variance over the last `window` samples plus an EWMA, all O(1) per update.
+
+    Samples are kept in a fixed-size ring buffer; when it is full the oldest sample
+    is replaced and Welford's update is applied for the added and removed value.
+    """
+
+    def __init__(self, window: int = DEFAULT_WINDOW, alpha: float = DEFAULT_ALPHA):
+        self.window = window
+        self.alpha = alpha
+        self._buffer = [0.0] * window
+        self._index = 0
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.ewma = None
+
+    def update(self, x: float) -> None:
+        if self.count < self.window:
+            self.count += 1
+            delta = x - self.mean
+            self.mean += delta / self.count
+            self._m2 += delta * (x - self.mean)
+        else:
+            old = self._buffer[self._index]
+            old_mean = self.mean
+            self.mean += (x - old) / self.window
+            self._m2 = max(0.0, self._m2 + (x - old) * (x - self.mean + old - old_mean))
+        self._buffer[self._index] = x
+        self._index = (self._index + 1) % self.window
+        self.ewma = x if self.ewma is None else self.ewma + self.alpha * (x - self.ewma)
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def zscore(self, x: float) -> float:
+        std = math.sqrt(self.variance)
+        return (x - self.mean) / std if std > 0 else 0.0
+
+
+class SensorDetector:
+    """Detection state of one sensor: rolling statistics of pressure and temperature."""
+
+    def __init__(self, window: int, alpha: float):
+        self.pressure = RollingStats(window, alpha)
+        self.temperature = RollingStats(window, alpha)
+
+
+class AnomalyDetector:
+    """Stateful, adaptive replacement for client.detect_anomalies.
+
+    Keeps one SensorDetector per sensor_id. A sample is anomalous when it is outside
+    the static ranges or, once `min_samples` samples are seen, when its z-score
+    against the sensor's rolling window exceeds `z_threshold`. The alert strings are
+    only built for anomalous samples.
+    """
+
+    def __init__(
+            self,
+            window: int = DEFAULT_WINDOW,
+            alpha: float = DEFAULT_ALPHA,
+            z_threshold: float = DEFAULT_Z_THRESHOLD,
+            min_samples: int = DEFAULT_MIN_SAMPLES,
+            pressure_range: tuple[float, float] = PRESSURE_RANGE,
+            temperature_range: tuple[float, float] = TEMPERATURE_RANGE,
+    ):
+        self.window = window
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.min_samples = min_samples
+        self.pressure_range = pressure_range
+        self.temperature_range = temperature_range
+        self.sensors: dict[int, SensorDetector] = {}
+
+    def check(self, package: PackageObj):
+        payload = package.payload
+        return self.check_values(payload.sensor_id, payload.pressure, payload.temperature)
+
+    def check_values(self, sensor_id: int, pressure: float, temperature: float):
+        """Updates the sensor's state and returns its anomalies (an empty tuple if none)."""
+        sensor = self.sensors.get(sensor_id)
+        if sensor is None:
+            sensor = self.sensors[sensor_id] = SensorDetector(self.window, self.alpha)
+
+        pressure_z = self._zscore(sensor.pressure, pressure)
+        temperature_z = self._zscore(sensor.temperature, temperature)
+        sensor.pressure.update(pressure)
+        sensor.temperature.update(temperature)
+
+        pressure_static = not (self.pressure_range[0] <= pressure <= self.pressure_range[1])
+        temperature_static = not (self.temperature_range[0] <= temperature <= self.temperature_range[1])
+        pressure_adaptive = abs(pressure_z) > self.z_threshold
+        temperature_adaptive = abs(temperature_z) > self.z_threshold
+        if not (pressure_static or temperature_static or pressure_adaptive or temperature_adaptive):
+            return _NO_ANOMALIES
+
+        anomalies = []
+        if pressure_static:  # Normalt trykområde
+            anomalies.append(f"Trykafvigelse: {pressure}")
+        if pressure_adaptive:
+            anomalies.append(f"Trykafvigelse (z={pressure_z:.1f}): {pressure}")
+        if temperature_static:  # Normal temperatur
+            anomalies.append(f"Temperaturafvigelse: {temperature}")
+        if temperature_adaptive:
+            anomalies.append(f"Temperaturafvigelse (z={temperature_z:.1f}): {temperature}")
+        return anomalies
+
+    def _zscore(self, stats: RollingStats, x: float) -> float:
+        if stats.count < self.min_samples:
+            return 0.0
+        return stats.zscore(x)
@@ -1,4 +1,29 @@
+from collections import Counter
+import pyarrow.dataset as ds
 import pandas as pd
+import argparse
+import os
+
+# Format of the 'Created At' column written by the consumers (str(datetime)); in
+# nanosecond mode (clock.py) the column holds integer nanoseconds instead
+SECOND_FORMAT: str = "%Y-%m-%d %H:%M:%S"
+NS_PER_SECOND: int = 1_000_000_000
+DEFAULT_CHUNKSIZE: int = 1_000_000
+
+
+def is_parquet(file_path) -> bool:
+    """True for Parquet logs: a .parquet file or a directory written by sinks.ParquetSink."""
+    return os.path.isdir(file_path) or file_path.endswith(".parquet")
+
+
+def parse_timestamps(column):
+    """Parses a 'Created At' or 'Consumed At' column of integer nanoseconds or ISO 8601 strings."""
+    if pd.api.types.is_integer_dtype(column):
+        return pd.to_datetime(column, unit='ns')
+    # ISO8601 accepts rows with and without microseconds, inferring the format
+    # from the first row would drop the others as NaT
+    return pd.to_datetime(column, format='ISO8601', errors='coerce')
+
 
 def calculate_events_per_second(file_path):
     """
@@ -12,12 +37,15 @@ def calculate_events_per_second(file_path):
     - DataFrame: Events per second grouped by timestamp.
     - tuple: Timestamp and the maximum events per second.
     """
-    # Load the CSV file
-    df = pd.read_csv(file_path)
+    # Load the CSV file, or only the needed column of a Parquet log
+    if is_parquet(file_path):
+        df = pd.read_parquet(file_path, columns=['Created At'])
+    else:
+        df = pd.read_csv(file_path)
 
-    # Convert timestamps to datetime with flexible parsing
+    # Convert timestamps to datetime
     try:
-        df['Created At'] = pd.to_datetime(df['Created At'], errors='coerce')
+        df['Created At'] = parse_timestamps(df['Created At'])
     except ValueError as e:
         print(f"Error parsing datetime: {e}")
         return
@@ -28,9 +56,60 @@ def calculate_events_per_second(file_path):
         df = df.dropna(subset=['Created At'])
 
     # Group by each second and count the number of events
-    df['Created At (Second)'] = df['Created At'].dt.floor('S')  # Round down to the nearest second
+    df['Created At (Second)'] = df['Created At'].dt.floor('1s')  # Round down to the nearest second
     events_per_second = df.groupby('Created At (Second)').size().reset_index(name='Events Per Second')
 
+    return _report(events_per_second)
+
+
+def calculate_events_per_second_streaming(file_path, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Streaming version of calculate_events_per_second with bounded memory.
+
+    Reads only the 'Created At' column in chunks of `chunksize` rows and counts
+    events per second by the 'YYYY-MM-DD HH:MM:SS' prefix of each timestamp, so
+    only the distinct seconds are parsed, with a fixed format. Nanosecond
+    timestamps, told apart row by row, are counted by integer division. Parquet logs are read batch by
+    batch with their typed timestamps.
+
+    Returns the same outputs as calculate_events_per_second.
+    """
+    counts = Counter()
+    if is_parquet(file_path):
+        for batch in ds.dataset(file_path, format="parquet").to_batches(columns=['Created At'], batch_size=chunksize):
+            counts.update(batch.column(0).to_pandas().dt.floor('1s').value_counts().to_dict())
+        seconds = pd.to_datetime(pd.Series(list(counts.keys()), dtype='datetime64[us]'))
+        values = list(counts.values())
+    else:
+        ns_counts = Counter()
+        for chunk in pd.read_csv(file_path, usecols=['Created At'], dtype=str, chunksize=chunksize):
+            # Blank cells are counted under '', which does not parse and is dropped with a warning below
+            column = chunk['Created At'].fillna('')
+            digits = column.str.fullmatch(r'\d+')
+            ns_counts.update((column[digits].astype('int64') // NS_PER_SECOND).value_counts().to_dict())
+            counts.update(column[~digits].str.slice(0, 19).value_counts().to_dict())
+        seconds = pd.concat([
+            pd.to_datetime(pd.Series(list(counts.keys()), dtype=str), format=SECOND_FORMAT, errors='coerce'),
+            pd.to_datetime(pd.Series(list(ns_counts.keys()), dtype='int64'), unit='s'),
+        ], ignore_index=True)
+        values = list(counts.values()) + list(ns_counts.values())
+
+    events_per_second = pd.DataFrame({
+        'Created At (Second)': seconds,
+        'Events Per Second': values,
+    })
+
+    # Check for rows with NaT (invalid timestamps)
+    if events_per_second['Created At (Second)'].isna().any():
+        print("Warning: Some timestamps could not be parsed. These rows will be excluded.")
+        events_per_second = events_per_second.dropna(subset=['Created At (Second)'])
+
+    # A second can be counted both from ISO 8601 and nanosecond rows
+    events_per_second = events_per_second.groupby('Created At (Second)', as_index=False)['Events Per Second'].sum()
+    return _report(events_per_second)
+
+
+def _report(events_per_second):
     # Find the maximum events per second and the corresponding timestamp
     max_events = events_per_second['Events Per Second'].max()
     max_timestamp = events_per_second.loc[events_per_second['Events Per Second'] == max_events, 'Created At (Second)'].iloc[0]
@@ -41,6 +120,19 @@ def calculate_events_per_second(file_path):
 
     return events_per_second, (max_timestamp, max_events)
 
-# Example usage
-file_path = "/home/root/code/logs/sensor_monitoring.csv"  # Replace with your actual CSV file path
-events_per_second_df, max_events_info = calculate_events_per_second(file_path)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file_path", nargs="?", default="/home/root/code/logs/sensor_monitoring.csv")
+    parser.add_argument("--streaming", action="store_true", help="read the log in chunks with bounded memory")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args()
+
+    if args.streaming:
+        calculate_events_per_second_streaming(args.file_path, chunksize=args.chunksize)
+    else:
+        calculate_events_per_second(args.file_path)
+
+
+if __name__ == "__main__":
+    main()
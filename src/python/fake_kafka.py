@@ -0,0 +1,155 @@
+from collections import namedtuple
+from kafka.producer.future import RecordMetadata
+from kafka.partitioner.default import murmur2
+from kafka.structs import TopicPartition
+import time
+
+# Same fields as the records returned by KafkaConsumer
+FakeRecord = namedtuple("FakeRecord", ["topic", "partition", "offset", "timestamp", "key", "value", "headers"])
+
+
+class StopConsuming(BaseException):
+    """Raised by FakeConsumer.poll when all records are consumed.
+
+    Like KeyboardInterrupt it is not an Exception, so it passes the consumers'
+    `except Exception` handlers and runs their cleanup before reaching the caller.
+    """
+
+
+class FakeBroker:
+    """In-memory stand-in for the Kafka cluster, used by benchmarks and replays.
+
+    `partitioner` has the signature of KafkaProducer's partitioner option, see partitioning.py.
+    """
+
+    def __init__(self, num_partitions: int = 1, partitioner=None):
+        self.num_partitions = num_partitions
+        self.partitioner = partitioner
+        self.topics: dict[str, list[list[FakeRecord]]] = {}
+
+    def append(self, topic: str, value: bytes, key: bytes = None, headers=None,
+               partition: int = None, timestamp_ms: int = None) -> FakeRecord:
+        partitions = self.topics.setdefault(topic, [[] for _ in range(self.num_partitions)])
+        if partition is None and self.partitioner is not None:
+            all_partitions = list(range(len(partitions)))
+            partition = self.partitioner(key, all_partitions, all_partitions)
+        elif partition is None:
+            # Same mapping as the default partitioner of KafkaProducer
+            partition = (murmur2(key) & 0x7FFFFFFF) % self.num_partitions if key is not None else 0
+        if timestamp_ms is None:
+            timestamp_ms = int(time.time() * 1000)
+        record = FakeRecord(topic, partition, len(partitions[partition]), timestamp_ms, key, value, headers or [])
+        partitions[partition].append(record)
+        return record
+
+
+class FakeFuture:
+    """Already completed FutureRecordMetadata."""
+
+    def __init__(self, metadata: RecordMetadata):
+        self.value = metadata
+
+    def add_callback(self, f, *args, **kwargs):
+        f(*args, self.value, **kwargs)
+        return self
+
+    def add_errback(self, f, *args, **kwargs):
+        return self
+
+    def get(self, timeout=None) -> RecordMetadata:
+        return self.value
+
+
+class FakeProducer:
+    """KafkaProducer look-alike that appends to a FakeBroker."""
+
+    def __init__(self, broker: FakeBroker = None):
+        self.broker = broker if broker is not None else FakeBroker()
+
+    def send(self, topic, value=None, key=None, headers=None, partition=None, timestamp_ms=None) -> FakeFuture:
+        record = self.broker.append(topic, value, key=key, headers=headers, partition=partition,
+                                    timestamp_ms=timestamp_ms)
+        return FakeFuture(RecordMetadata(
+            topic=topic,
+            partition=record.partition,
+            topic_partition=TopicPartition(topic, record.partition),
+            offset=record.offset,
+            timestamp=record.timestamp,
+            log_start_offset=0,
+            checksum=None,
+            serialized_key_size=len(key) if key is not None else -1,
+            serialized_value_size=len(value) if value is not None else -1,
+            serialized_header_size=-1,
+        ))
+
+    def flush(self, timeout=None) -> None:
+        pass
+
+    def close(self, timeout=None) -> None:
+        pass
+
+
+class FakeConsumer:
+    """KafkaConsumer look-alike that reads the records of `topics` from a FakeBroker once.
+
+    `poll_latency` seconds are spent per fetch of `max_poll_records` records to model
+    the network round-trip. Iteration ends when all records are consumed; poll
+    raises StopConsuming instead, since poll loops never end on their own.
+    """
+
+    def __init__(self, broker: FakeBroker, *topics: str, poll_latency: float = 0.0, max_poll_records: int = 500):
+        self.poll_latency = poll_latency
+        self.max_poll_records = max_poll_records
+        self._pending = {
+            TopicPartition(topic, partition): list(records)
+            for topic in topics
+            for partition, records in enumerate(broker.topics.get(topic, []))
+        }
+        self._positions = {tp: 0 for tp in self._pending}
+        self.committed_positions = {}
+
+    def __iter__(self):
+        while True:
+            batches = self._fetch(self.max_poll_records)
+            if not batches:
+                return
+            for records in batches.values():
+                yield from records
+
+    def poll(self, timeout_ms: int = 0, max_records: int = None, update_offsets: bool = True) -> dict:
+        batches = self._fetch(max_records or self.max_poll_records)
+        if not batches:
+            raise StopConsuming()
+        return batches
+
+    def _fetch(self, max_records: int) -> dict:
+        if self.poll_latency:
+            time.sleep(self.poll_latency)
+        batches = {}
+        for tp, records in self._pending.items():
+            position = self._positions[tp]
+            if position >= len(records) or max_records <= 0:
+                continue
+            batch = records[position:position + max_records]
+            batches[tp] = batch
+            self._positions[tp] += len(batch)
+            max_records -= len(batch)
+        return batches
+
+    def commit(self, offsets=None) -> None:
+        self.committed_positions = dict(self._positions)
+
+    def assignment(self) -> set:
+        return set(self._pending)
+
+    def position(self, tp: TopicPartition) -> int:
+        return self._positions[tp]
+
+    def beginning_offsets(self, partitions) -> dict:
+        return {tp: 0 for tp in partitions}
+
+    def end_offsets(self, partitions) -> dict:
+        return {tp: len(self._pending[tp]) for tp in partitions}
+
+    def close(self, autocommit: bool = True) -> None:
+        pass
@@ -0,0 +1,227 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import math
+import json
+import time
+import os
+
+# Bucket boundaries grow by 2% per bucket, which bounds the relative percentile error
+DEFAULT_GROWTH: float = 1.02
+# Values are recorded in microseconds; everything below 1 µs lands in bucket 0
+_UNIT: float = 1e-6
+
+REPORT_INTERVAL: float = 10.0
+# Only look at the clock every N records to keep record() cheap
+_CLOCK_CHECK_EVERY: int = 1024
+
+
+class LogHistogram:
+    """Log-bucketed latency histogram. Sparse, mergeable and JSON serializable.
+
+    Negative durations, which only come from clock skew between producer and
+    consumer, are counted in `negative` and kept out of the buckets and percentiles.
+    """
+
+    def __init__(self, growth: float = DEFAULT_GROWTH):
+        self.growth = growth
+        self._log_growth = math.log(growth)
+        self.counts: dict[int, int] = {}
+        self.count = 0
+        self.negative = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        if seconds < 0:
+            self.negative += 1
+            return
+        units = seconds / _UNIT
+        index = int(math.log(units) / self._log_growth) + 1 if units >= 1 else 0
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """Returns the upper bound (in seconds) of the bucket holding the q-th percentile."""
+        if self.count == 0:
+            return math.nan
+        rank = q / 100 * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.max, self.growth ** index * _UNIT)
+        return self.max
+
+    def merge(self, other: "LogHistogram") -> None:
+        if other.growth != self.growth:
+            raise ValueError("Cannot merge histograms with different bucket growth")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.negative += other.negative
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def to_dict(self) -> dict:
+        return {
+            "growth": self.growth,
+            "counts": {str(index): count for index, count in self.counts.items()},
+            "count": self.count,
+            "negative": self.negative,
+            "total": self.total,
+            "min": self.min if self.count else None,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LogHistogram":
+        histogram = cls(growth=data["growth"])
+        histogram.counts = {int(index): count for index, count in data["counts"].items()}
+        histogram.count = data["count"]
+        histogram.negative = data.get("negative", 0)  # Absent in older snapshots
+        histogram.total = data["total"]
+        histogram.min = data["min"] if data["min"] is not None else math.inf
+        histogram.max = data["max"]
+        return histogram
+
+
+class LatencyTracker:
+    """Keeps end-to-end latency histograms per topic and per sensor_id.
+
+    Every `report_interval` seconds a p50/p95/p99/max line is printed per topic and,
+    when `snapshot_dir` is set, the histograms are dumped there as JSON so the
+    snapshots of several consumers can be merged with merge_snapshots.
+    """
+
+    def __init__(self, report_interval: float = REPORT_INTERVAL, snapshot_dir: str = None):
+        self.report_interval = report_interval
+        self.snapshot_dir = snapshot_dir
+        self.topics: dict[str, LogHistogram] = {}
+        self.sensors: dict[int, LogHistogram] = {}
+        self._lock = threading.Lock()
+        self._since_check = 0
+        self._last_report = time.monotonic()
+        self._server = None
+
+    def record(self, topic: str, sensor_id: int, seconds: float) -> None:
+        with self._lock:
+            self._histogram(self.topics, topic).record(seconds)
+            self._histogram(self.sensors, sensor_id).record(seconds)
+        self._since_check += 1
+        if self._since_check >= _CLOCK_CHECK_EVERY:
+            self._since_check = 0
+            if time.monotonic() - self._last_report >= self.report_interval:
+                self.report()
+
+    def record_many(self, topic: str, sensor_ids: list[int], seconds: list[float]) -> None:
+        with self._lock:
+            topic_histogram = self._histogram(self.topics, topic)
+            for sensor_id, value in zip(sensor_ids, seconds):
+                topic_histogram.record(value)
+                self._histogram(self.sensors, sensor_id).record(value)
+        if time.monotonic() - self._last_report >= self.report_interval:
+            self.report()
+
+    def report(self) -> None:
+        self._last_report = time.monotonic()
+        with self._lock:
+            for topic, histogram in sorted(self.topics.items()):
+                print(f"latency topic={topic} {format_summary(histogram)}")
+            if self.snapshot_dir is not None:
+                self.dump(self.snapshot_dir)
+
+    def dump(self, snapshot_dir: str) -> str:
+        """Writes the histograms to a JSON snapshot file and returns its path."""
+        os.makedirs(snapshot_dir, exist_ok=True)
+        path = os.path.join(snapshot_dir, f"latency-{os.getpid()}.json")
+        snapshot = {
+            "taken_at": time.time(),
+            "topics": {topic: histogram.to_dict() for topic, histogram in self.topics.items()},
+            "sensors": {str(sensor_id): histogram.to_dict() for sensor_id, histogram in self.sensors.items()},
+        }
+        with open(path + ".tmp", "w") as file:
+            json.dump(snapshot, file)
+        os.replace(path + ".tmp", path)
+        return path
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> None:
+        """Serves the histograms in Prometheus text format on http://host:port/metrics."""
+        tracker = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = tracker.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def prometheus_text(self) -> str:
+        lines = ["# TYPE acaa_latency_seconds summary"]
+        negative = ["# TYPE acaa_latency_negative_total counter"]
+        with self._lock:
+            groups = [("topic", self.topics), ("sensor_id", self.sensors)]
+            for label, histograms in groups:
+                for name, histogram in sorted(histograms.items()):
+                    labels = f'{label}="{name}"'
+                    for q in (50, 95, 99):
+                        lines.append(f'acaa_latency_seconds{{{labels},quantile="{q / 100}"}} {histogram.percentile(q)}')
+                    lines.append(f'acaa_latency_seconds{{{labels},quantile="1.0"}} {histogram.max}')
+                    lines.append(f"acaa_latency_seconds_sum{{{labels}}} {histogram.total}")
+                    lines.append(f"acaa_latency_seconds_count{{{labels}}} {histogram.count}")
+                    negative.append(f"acaa_latency_negative_total{{{labels}}} {histogram.negative}")
+        return "\n".join(lines + negative) + "\n"
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+        if self.snapshot_dir is not None:
+            with self._lock:
+                self.dump(self.snapshot_dir)
+
+    @staticmethod
+    def _histogram(histograms: dict, key) -> LogHistogram:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = LogHistogram()
+        return histogram
+
+
+def format_summary(histogram: LogHistogram) -> str:
+    return (
+        f"n={histogram.count} "
+        + " ".join(f"p{q}={histogram.percentile(q) * 1000:.2f}ms" for q in (50, 95, 99))
+        + f" max={histogram.max * 1000:.2f}ms"
+        + f" negative={histogram.negative}"
+    )
+
+
+def merge_snapshots(paths: list[str]) -> dict[str, dict]:
+    """Merges snapshot files written by LatencyTracker.dump into per-topic and per-sensor histograms."""
+    merged = {"topics": {}, "sensors": {}}
+    for path in paths:
+        with open(path) as file:
+            snapshot = json.load(file)
+        for group in ("topics", "sensors"):
+            for name, data in snapshot[group].items():
+                histogram = LogHistogram.from_dict(data)
+                if name in merged[group]:
+                    merged[group][name].merge(histogram)
+                else:
+                    merged[group][name] = histogram
+    return merged
@@ -0,0 +1,150 @@
+from client import KAFKA_BOOTSTRAP
+from kafka import KafkaConsumer
+from kafka.admin import KafkaAdminClient, NewTopic
+from kafka.errors import TopicAlreadyExistsError
+from kafka.partitioner.default import murmur2
+from kafka.structs import TopicPartition
+import itertools
+import random
+import threading
+import argparse
+
+PARTITIONERS: list[str] = ["hash", "map", "round-robin"]
+
+
+def hash_partitioner(key: bytes, all_partitions: list[int], available: list[int]) -> int:
+    """murmur2 of the key, like the default partitioner. Keyless records go to a random partition."""
+    if key is None:
+        return random.choice(available or all_partitions)
+    return all_partitions[(murmur2(key) & 0x7FFFFFFF) % len(all_partitions)]
+
+
+class SensorMapPartitioner:
+    """Sends each sensor to the partition given in `mapping` (sensor_id -> partition).
+
+    Sensors missing from the map, and partitions beyond the topic's partition count,
+    fall back to hash_partitioner.
+    """
+
+    def __init__(self, mapping: dict[int, int]):
+        self.mapping = mapping
+
+    def __call__(self, key: bytes, all_partitions: list[int], available: list[int]) -> int:
+        partition = self.mapping.get(int(key)) if key is not None and key.isdigit() else None
+        if partition is None or partition not in all_partitions:
+            return hash_partitioner(key, all_partitions, available)
+        return partition
+
+
+class RoundRobinPartitioner:
+    """Spreads the keys evenly over the partitions while keeping each key on one partition.
+
+    A key is assigned the next partition in turn the first time it is seen and keeps
+    it afterwards, so records of one sensor stay ordered. Keyless records are spread
+    round-robin one by one. Assignments are per producer, so processes producing the
+    same keys should use SensorMapPartitioner instead.
+    """
+
+    def __init__(self):
+        self._assigned: dict[bytes, int] = {}
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def __call__(self, key: bytes, all_partitions: list[int], available: list[int]) -> int:
+        if key is None:
+            return all_partitions[next(self._next) % len(all_partitions)]
+        partition = self._assigned.get(key)
+        if partition is None or partition not in all_partitions:
+            with self._lock:
+                partition = self._assigned[key] = all_partitions[next(self._next) % len(all_partitions)]
+        return partition
+
+
+def parse_partition_map(text: str) -> dict[int, int]:
+    """Parses "sensor:partition,..." such as "1:0,2:0,3:1"."""
+    mapping = {}
+    for item in filter(None, text.split(",")):
+        sensor_id, partition = item.split(":")
+        mapping[int(sensor_id)] = int(partition)
+    return mapping
+
+
+def get_partitioner(name: str = "hash", mapping: dict[int, int] = None):
+    """Returns a partitioner for KafkaProducer(partitioner=...) by name, see PARTITIONERS."""
+    if name == "hash":
+        return hash_partitioner
+    if name == "map":
+        if not mapping:
+            raise ValueError("The map partitioner needs a sensor -> partition mapping")
+        return SensorMapPartitioner(mapping)
+    if name == "round-robin":
+        return RoundRobinPartitioner()
+    raise ValueError(f"Unknown partitioner: {name}")
+
+
+def create_topic(topic: str, num_partitions: int, replication_factor: int = 1, **topic_configs) -> bool:
+    """Creates `topic` with `num_partitions` partitions. Returns False if it already exists."""
+    admin = KafkaAdminClient(bootstrap_servers=KAFKA_BOOTSTRAP)
+    try:
+        admin.create_topics([NewTopic(
+            name=topic,
+            num_partitions=num_partitions,
+            replication_factor=replication_factor,
+            topic_configs={key: str(value) for key, value in topic_configs.items()},
+        )])
+        return True
+    except TopicAlreadyExistsError:
+        return False
+    finally:
+        admin.close()
+
+
+def partition_counts(consumer, partitions: list[TopicPartition]) -> dict[int, int]:
+    """Returns the number of retained records per partition from the log start and end offsets."""
+    start = consumer.beginning_offsets(partitions)
+    end = consumer.end_offsets(partitions)
+    return {tp.partition: end[tp] - start[tp] for tp in sorted(partitions)}
+
+
+def skew_report(counts: dict[int, int]) -> float:
+    """Prints the records and share per partition and returns the skew (largest / mean partition)."""
+    total = sum(counts.values())
+    mean = total / len(counts) if counts else 0
+    for partition, count in counts.items():
+        print(f"Partition {partition}: {count} records ({count / total if total else 0:.1%})")
+    skew = max(counts.values()) / mean if mean else 0.0
+    print(f"Total {total} records over {len(counts)} partitions, skew (max / mean) {skew:.2f}")
+    return skew
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create topics and report how records are spread over partitions.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="create a topic with a chosen partition count")
+    create.add_argument("topic")
+    create.add_argument("--partitions", type=int, default=6)
+    create.add_argument("--replication-factor", type=int, default=1)
+    skew = commands.add_parser("skew", help="print the records per partition of a topic")
+    skew.add_argument("topic")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        if create_topic(args.topic, args.partitions, args.replication_factor):
+            print(f"Created {args.topic} with {args.partitions} partitions")
+        else:
+            print(f"{args.topic} already exists")
+        return
+
+    consumer = KafkaConsumer(bootstrap_servers=KAFKA_BOOTSTRAP)
+    try:
+        partitions = [TopicPartition(args.topic, p) for p in consumer.partitions_for_topic(args.topic) or ()]
+        if not partitions:
+            print(f"Unknown topic: {args.topic}")
+            return
+        skew_report(partition_counts(consumer, partitions))
+    finally:
+        consumer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,247 @@
-import threading
-from client import get_producer, produce_msg
+from client import get_shared_producer, close_producers, DEFAULT_ENCODING
+from data_model import VALID_SENSOR_IDS, generate_samples
+from serializers import get_serializer
+from partitioning import PARTITIONERS, get_partitioner, parse_partition_map
+from replay import Recorder, RecordingProducer
+import multiprocessing as mp
+import numpy as np
+import argparse
+import queue
 import time
 
-class RepeatTimer(threading.Thread):
-    def __init__(self, interval, function, args=None, kwargs=None):
-        super().__init__()
-        self.interval = interval
-        self.function = function
-        self.args = args if args else []
-        self.kwargs = kwargs if kwargs else {}
-        self.finished = threading.Event()
-
-    def run(self):
-        while not self.finished.is_set():
-            start_time = time.time()
-            self.function(*self.args, **self.kwargs)
-            elapsed_time = time.time() - start_time
-            time.sleep(max(0, self.interval - elapsed_time))
-
-    def cancel(self):
-        self.finished.set()
+RAMP_PROFILES: list[str] = ["constant", "linear", "step"]
+RAMP_STEPS: int = 4
+RATE_UPDATE_INTERVAL: float = 0.05
+# Seconds between checks for exited workers while waiting for their results
+RESULT_POLL_INTERVAL: float = 1.0
 
-def main():
 
-    num_producers = 10
-    target_events_per_second = 10000
-    events_per_thread_per_second = target_events_per_second / num_producers
-    interval_per_event = 1 / events_per_thread_per_second  # Interval in seconds
+class TokenBucket:
+    """Paces events to `rate` per second. Tokens accrue continuously up to `capacity`."""
 
-    # Create producers
-    timers = [
-        RepeatTimer(interval_per_event, produce_msg, [i, "SENSOR_DATA", get_producer()])
-        for i in range(1, num_producers + 1)
-    ]
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate / 100, 1)
+        self.tokens = 0.0
+        self.last = time.perf_counter()
+
+    def take(self, n: int = 1, timeout: float = None) -> bool:
+        """Waits until `n` tokens are available and consumes them.
+
+        Returns False if they did not become available within `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            now = time.perf_counter()
+            self.tokens = min(max(self.capacity, n), self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens >= n:
+                self.tokens -= n
+                return True
+            wait = (n - self.tokens) / self.rate if self.rate > 0 else float("inf")
+            if deadline is not None:
+                if now >= deadline:
+                    return False
+                wait = min(wait, deadline - now)
+            time.sleep(wait)
+
+
+def ramp_rate(profile: str, target: float, elapsed: float, ramp: float) -> float:
+    """Returns the target rate after `elapsed` seconds for a ramp profile lasting `ramp` seconds."""
+    if profile == "constant" or ramp <= 0 or elapsed >= ramp:
+        return target
+    if profile == "linear":
+        return target * elapsed / ramp
+    if profile == "step":
+        return target * (int(elapsed / ramp * RAMP_STEPS) + 1) / RAMP_STEPS
+    raise ValueError(f"Unknown ramp profile: {profile}")
 
-    try:
-        # Start all threads
-        for timer in timers:
-            timer.start()
 
-        # Let them run for 10 minutes
-        time.sleep(600)
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
 
+
+def run_generator(
+        rate: float,
+        duration: float,
+        topic: str = "SENSOR_DATA",
+        profile: str = "constant",
+        ramp: float = 0,
+        batch_size: int = 100,
+        latency_sample: int = 10,
+        serializer: str = "json",
+        seed: int = None,
+        partitioner: str = "hash",
+        partition_map: dict[int, int] = None,
+        timestamp_ns: bool = False,
+        record: str = None,
+        offline: bool = False,
+        results=None,
+) -> tuple[int, float, list[float]]:
+    """Produces sensor samples at `rate` events per second for `duration` seconds.
+
+    Every `latency_sample`-th send is timed from send() until the broker acknowledges
+    it. Returns (events sent, elapsed seconds, send latencies in seconds) and also
+    puts the result on `results` when running in a worker process. `partitioner` and
+    `partition_map` are passed to partitioning.get_partitioner. With `timestamp_ns`
+    the samples carry integer nanosecond timestamps, see clock.py. With `record`
+    the records sent to `topic` are appended to that recording file (see replay.py);
+    `offline` only records them, without a Kafka cluster, and measures no send latency.
+    """
+    encoder = get_serializer(serializer) if serializer != "json" else None
+    rng = np.random.default_rng(seed)
+    bucket = TokenBucket(ramp_rate(profile, rate, 0, ramp), capacity=max(batch_size, rate / 100))
+    latencies = []
+    sensor_keys = {sensor_id: str(sensor_id).encode(DEFAULT_ENCODING) for sensor_id in VALID_SENSOR_IDS}
+    sent = 0
+    producer = None
+    error = None
+
+    def record_latency(started_at: float, _metadata) -> None:
+        latencies.append(time.perf_counter() - started_at)
+
+    start = time.perf_counter()
+    try:
+        producer = None if offline else get_shared_producer(partitioner=get_partitioner(partitioner, partition_map))
+        if record is not None:
+            producer = RecordingProducer(Recorder(record), producer, topic=topic)
+        while (elapsed := time.perf_counter() - start) < duration:
+            bucket.rate = ramp_rate(profile, rate, elapsed, ramp)
+            if not bucket.take(batch_size, timeout=RATE_UPDATE_INTERVAL):
+                continue
+            for sensor_id, value in generate_samples(batch_size, seed=rng, as_bytes=encoder is None,
+                                                        timestamp_ns=timestamp_ns):
+                if encoder is not None:
+                    value = encoder.serialize(value)
+                future = producer.send(topic, key=sensor_keys[sensor_id], value=value)
+                if not offline and sent % latency_sample == 0:
+                    future.add_callback(record_latency, time.perf_counter())
+                sent += 1
     except KeyboardInterrupt:
         pass
+    except Exception as e:
+        error = e
+        raise
     finally:
-        # Stop all threads
-        for timer in timers:
-            timer.cancel()
+        try:
+            if producer is not None:
+                producer.flush()
+                if record is not None:
+                    producer.recorder.close()
+        finally:
+            elapsed = time.perf_counter() - start
+            if results is not None:
+                # Also put when failing, so the parent never waits for a result that does not come
+                results.put((sent, elapsed, latencies, None if error is None else repr(error)))
+                close_producers()  # Worker processes exit without running atexit hooks
+    return sent, elapsed, latencies
+
+
+def collect_results(results, processes: list) -> list[tuple]:
+    """Gets one (sent, elapsed, latencies, error) result per worker from `results`.
+
+    Stops waiting once every worker has exited, so a worker that died without
+    putting its result cannot block the parent.
+    """
+    outcomes = []
+    while len(outcomes) < len(processes):
+        try:
+            outcomes.append(results.get(timeout=RESULT_POLL_INTERVAL))
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes) and results.empty():
+                break
+    return outcomes
+
+
+def report(sent: int, elapsed: float, latencies: list[float], target: float) -> None:
+    latencies = sorted(latencies)
+    print(f"Sent {sent} events in {elapsed:.1f}s: {sent / elapsed:,.0f} events/s (target {target:,.0f})")
+    if not latencies:
+        # Offline runs have no broker acknowledgements to time
+        print("Send latency: not measured")
+        return
+    print("Send latency (ms): " + ", ".join(
+        f"p{q}={percentile(latencies, q) * 1000:.2f}" for q in (50, 95, 99)
+    ) + f", max={latencies[-1] * 1000:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rate controlled SENSOR_DATA load generator.")
+    parser.add_argument("--rate", type=float, default=10000, help="target events per second")
+    parser.add_argument("--duration", type=float, default=600, help="run time in seconds")
+    parser.add_argument("--profile", choices=RAMP_PROFILES, default="constant")
+    parser.add_argument("--ramp", type=float, default=0, help="seconds until the target rate is reached")
+    parser.add_argument("--processes", type=int, default=1, help="number of producer processes")
+    parser.add_argument("--batch-size", type=int, default=100, help="events sent per token bucket take")
+    parser.add_argument("--topic", default="SENSOR_DATA")
+    parser.add_argument("--serializer", choices=["json", "avro"], default="json")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible samples")
+    parser.add_argument("--partitioner", choices=PARTITIONERS, default="hash",
+                        help="how sensor keys are assigned to partitions")
+    parser.add_argument("--partition-map", type=parse_partition_map, default=None,
+                        help='sensor to partition map for --partitioner map, e.g. "1:0,2:1,3:2"')
+    parser.add_argument("--timestamps", choices=["float", "ns"], default="float",
+                        help="created_at as a float UNIX timestamp or created_at_ns in integer nanoseconds")
+    parser.add_argument("--record", default=None, help="also append the produced records to this recording file")
+    parser.add_argument("--offline", action="store_true", help="only record, without sending to Kafka")
+    args = parser.parse_args()
+    if args.offline and args.record is None:
+        parser.error("--offline needs --record")
+    if args.record is not None:
+        Recorder(args.record).close()  # Writes the file header before the workers append to it
+
+    options = dict(
+        duration=args.duration,
+        topic=args.topic,
+        profile=args.profile,
+        ramp=args.ramp,
+        batch_size=args.batch_size,
+        serializer=args.serializer,
+        partitioner=args.partitioner,
+        partition_map=args.partition_map,
+        timestamp_ns=args.timestamps == "ns",
+        record=args.record,
+        offline=args.offline,
+    )
+    if args.processes <= 1:
+        sent, elapsed, latencies = run_generator(args.rate, seed=args.seed, **options)
+        report(sent, elapsed, latencies, args.rate)
+        return
+
+    results = mp.Queue()
+    processes = [
+        mp.Process(
+            target=run_generator,
+            args=(args.rate / args.processes,),
+            kwargs=dict(options, seed=None if args.seed is None else args.seed + i, results=results),
+        )
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        outcomes = collect_results(results, processes)
+    except KeyboardInterrupt:
+        # The workers received the interrupt as well and report what they sent
+        outcomes = collect_results(results, processes)
+    for process in processes:
+        process.join()
+    for error in filter(None, (error for _, _, _, error in outcomes)):
+        print(f"Worker failed: {error}")
+    missing = len(processes) - len(outcomes)
+    if missing:
+        print(f"{missing} worker(s) exited without a result")
+    if not outcomes:
+        return
+    report(
+        sum(sent for sent, _, _, _ in outcomes),
+        max(elapsed for _, elapsed, _, _ in outcomes),
+        [latency for _, _, latencies, _ in outcomes for latency in latencies],
+        args.rate,
+    )
+
 
 if __name__ == "__main__":
     main()
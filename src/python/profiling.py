@@ -0,0 +1,201 @@
+from collections import Counter
+import threading
+import cProfile
+import random
+import json
+import time
+import sys
+import os
+
+# Enables the stage timers: "stages", "cprofile:<seconds>" or "sample:<seconds>".
+# The latter two also profile the whole process for a window of <seconds>.
+PROFILE_ENV: str = "ACAA_PROFILE"
+
+DEFAULT_SAMPLE_EVERY: int = 64
+REPORT_INTERVAL: float = 10.0
+# Interval of the stack sampler of the "sample" window
+STACK_SAMPLE_INTERVAL: float = 0.005
+
+
+class _Laps:
+    """Times consecutive stages of one sampled message."""
+
+    __slots__ = ("profiler", "last")
+
+    def __init__(self, profiler: "StageProfiler"):
+        self.profiler = profiler
+        self.last = 0
+
+    def lap(self, stage: str) -> None:
+        """Adds the time since the previous lap (or start) to `stage`."""
+        now = time.perf_counter_ns()
+        self.profiler.add(stage, now - self.last)
+        self.last = now
+
+
+class StageProfiler:
+    """Per-stage timers for the consumer loops, sampled every `sample_every` messages on average.
+
+    start() is called before each message is fetched and returns a _Laps object
+    for sampled messages only (None otherwise); the loop then calls lap(stage)
+    after each stage. The gaps between samples are random, so periodic work such
+    as the CsvSink flush every 1000 rows is not over- or undersampled. Every
+    `report_interval` seconds the mean and max per stage are printed and, when
+    `snapshot_dir` is set, written there as JSON.
+    """
+
+    def __init__(self, sample_every: int = DEFAULT_SAMPLE_EVERY, report_interval: float = REPORT_INTERVAL,
+                 snapshot_dir: str = None, window=None):
+        self.sample_every = sample_every
+        self.report_interval = report_interval
+        self.snapshot_dir = snapshot_dir
+        self.window = window
+        self.messages = 0
+        self._next_sample = 1
+        # stage -> [samples, total ns, max ns]
+        self.stages: dict[str, list[int]] = {}
+        self._laps = _Laps(self)
+        self._last_report = time.monotonic()
+
+    def start(self):
+        self.messages += 1
+        if self.messages < self._next_sample:
+            return None
+        self._next_sample = self.messages + random.randint(1, 2 * self.sample_every - 1)
+        if time.monotonic() - self._last_report >= self.report_interval:
+            self.report()
+        if self.window is not None and self.window.expired():
+            self.window.stop()
+            self.window = None
+        self._laps.last = time.perf_counter_ns()
+        return self._laps
+
+    def add(self, stage: str, ns: int) -> None:
+        totals = self.stages.get(stage)
+        if totals is None:
+            totals = self.stages[stage] = [0, 0, 0]
+        totals[0] += 1
+        totals[1] += ns
+        if ns > totals[2]:
+            totals[2] = ns
+
+    def summary(self) -> dict[str, dict]:
+        spent = sum(total for _, total, _ in self.stages.values()) or 1
+        return {
+            stage: {
+                "samples": samples,
+                "mean_us": total / samples / 1000,
+                "max_us": max_ns / 1000,
+                "share": total / spent,
+            }
+            for stage, (samples, total, max_ns) in self.stages.items()
+        }
+
+    def report(self) -> None:
+        self._last_report = time.monotonic()
+        summary = self.summary()
+        print(f"profile messages={self.messages} " + " ".join(
+            f"{stage}={values['mean_us']:.1f}us({values['share']:.0%})" for stage, values in summary.items()
+        ))
+        if self.snapshot_dir is not None:
+            self.dump(self.snapshot_dir)
+
+    def dump(self, snapshot_dir: str) -> str:
+        """Writes the stage summary to a JSON snapshot file and returns its path."""
+        os.makedirs(snapshot_dir, exist_ok=True)
+        path = os.path.join(snapshot_dir, f"stages-{os.getpid()}.json")
+        with open(path + ".tmp", "w") as file:
+            json.dump({"taken_at": time.time(), "messages": self.messages, "stages": self.summary()}, file)
+        os.replace(path + ".tmp", path)
+        return path
+
+    def close(self) -> None:
+        if self.window is not None:
+            self.window.stop()
+            self.window = None
+        self.report()
+
+
+class CProfileWindow:
+    """Runs cProfile in the calling thread for `duration` seconds and dumps the stats to `path`."""
+
+    def __init__(self, duration: float, path: str):
+        self.path = path
+        self.deadline = time.monotonic() + duration
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+    def stop(self) -> None:
+        self._profile.disable()
+        self._profile.dump_stats(self.path)
+        print(f"Wrote cProfile stats to {self.path}, view with: python -m pstats {self.path}")
+
+
+class StackSampleWindow:
+    """Samples the stack of the calling thread from a background thread for `duration` seconds.
+
+    The counts are written to `path` in the collapsed format ("outer;inner count"
+    per line) read by flamegraph tools. The profiled thread itself does no work.
+    """
+
+    def __init__(self, duration: float, path: str, interval: float = STACK_SAMPLE_INTERVAL):
+        self.path = path
+        self.deadline = time.monotonic() + duration
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread_id = threading.get_ident()
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._run, daemon=True)
+        self._sampler.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval) and not self.expired():
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+        self._write()
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._sampler.join()
+
+    def _write(self) -> None:
+        with open(self.path, "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        print(f"Wrote {sum(self.stacks.values())} stack samples to {self.path}")
+
+
+def get_profiler(snapshot_dir: str = "logs/profile", sample_every: int = DEFAULT_SAMPLE_EVERY,
+                 report_interval: float = REPORT_INTERVAL) -> StageProfiler:
+    """Returns a StageProfiler as configured by the ACAA_PROFILE variable, or None when it is unset.
+
+    Call it from the thread running the consumer loop, which the windows profile.
+    """
+    setting = os.environ.get(PROFILE_ENV)
+    if not setting:
+        return None
+    mode, _, seconds = setting.partition(":")
+    window = None
+    if mode in ("cprofile", "sample"):
+        os.makedirs(snapshot_dir, exist_ok=True)
+        duration = float(seconds or 60)
+        if mode == "cprofile":
+            window = CProfileWindow(duration, os.path.join(snapshot_dir, f"cprofile-{os.getpid()}.prof"))
+        else:
+            window = StackSampleWindow(duration, os.path.join(snapshot_dir, f"stacks-{os.getpid()}.collapsed"))
+    elif mode != "stages":
+        raise ValueError(f"Unknown {PROFILE_ENV} mode: {mode}")
+    return StageProfiler(sample_every=sample_every, report_interval=report_interval,
+                         snapshot_dir=snapshot_dir, window=window)
@@ -0,0 +1,313 @@
+"""Records produced SENSOR_DATA records to a file and replays them offline or into Kafka.
+
+A recording is an append-only binary file: FILE_MAGIC followed by one
+RECORD_HEADER (timestamp_ns, key length, value length) plus the key and value
+bytes per record. A key length of -1 stands for a record without a key.
+Record with `producer.py --record FILE` (add --offline to skip Kafka).
+
+    python replay.py info FILE
+    python replay.py kafka FILE [--speed 2]          # replay into SENSOR_DATA
+    python replay.py consume FILE [--speed 0]        # run recive_msg_with_logging in-process
+
+--speed scales the recorded timing (1 is the original pace); 0 replays as fast as possible.
+"""
+from client import get_shared_producer, recive_msg_with_logging, send_raw
+from clock import now_ns, wire_timestamp
+from fake_kafka import FakeBroker, FakeConsumer, FakeFuture, FakeProducer, StopConsuming
+from latency import LatencyTracker
+from serializers import get_serializer
+import threading
+import argparse
+import tempfile
+import struct
+import mmap
+import time
+import os
+
+FILE_MAGIC: bytes = b"ACAAREC\x01"
+# timestamp_ns, key length (-1 for no key), value length
+RECORD_HEADER = struct.Struct("<qiI")
+# Bytes buffered by Recorder before they are appended to the file in one write
+DEFAULT_BUFFER_SIZE: int = 1 << 20
+# Waits shorter than this are not slept, the record is sent slightly early instead
+MIN_SLEEP: float = 0.001
+
+
+class Recorder:
+    """Appends records to a recording file.
+
+    Records are buffered and written with one os.write on an O_APPEND descriptor,
+    so several processes can record into the same file without interleaving
+    partial records. Create the file (e.g. Recorder(path).close()) before
+    starting them, so only one process writes FILE_MAGIC.
+    """
+
+    def __init__(self, path: str, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.records = 0
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        if os.fstat(self._fd).st_size == 0:
+            os.write(self._fd, FILE_MAGIC)
+        else:
+            _check_magic(path)
+
+    def append(self, key: bytes, value: bytes, timestamp_ns: int = None) -> None:
+        if timestamp_ns is None:
+            timestamp_ns = now_ns()
+        with self._lock:
+            self._buffer += RECORD_HEADER.pack(timestamp_ns, -1 if key is None else len(key), len(value))
+            if key is not None:
+                self._buffer += key
+            self._buffer += value
+            self.records += 1
+            if len(self._buffer) >= self.buffer_size:
+                self._flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._buffer:
+            os.write(self._fd, self._buffer)
+            self._buffer.clear()
+
+    def close(self) -> None:
+        if self._fd is not None:
+            self.flush()
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RecordingProducer:
+    """Wraps a producer and records every record sent to `topic`.
+
+    Without a `producer` the records are only recorded, so a load scenario can be
+    captured without a cluster.
+    """
+
+    def __init__(self, recorder: Recorder, producer=None, topic: str = "SENSOR_DATA"):
+        self.recorder = recorder
+        self.producer = producer
+        self.topic = topic
+
+    def send(self, topic, value=None, key=None, headers=None, partition=None, timestamp_ms=None):
+        if topic == self.topic:
+            self.recorder.append(key, value)
+        if self.producer is None:
+            return FakeFuture(None)
+        return self.producer.send(topic, value=value, key=key, headers=headers, partition=partition,
+                                  timestamp_ms=timestamp_ms)
+
+    def flush(self, timeout=None) -> None:
+        self.recorder.flush()
+        if self.producer is not None:
+            self.producer.flush(timeout=timeout)
+
+    def close(self, timeout=None) -> None:
+        self.recorder.close()
+        if self.producer is not None:
+            self.producer.close(timeout=timeout)
+
+
+def _check_magic(path: str) -> None:
+    with open(path, "rb") as file:
+        if file.read(len(FILE_MAGIC)) != FILE_MAGIC:
+            raise ValueError(f"{path} is not a recording")
+
+
+def read_records(path: str):
+    """Yields (timestamp_ns, key, value) per record of a recording, read through mmap.
+
+    A record cut short at the end of the file, as left by a crashed recorder, is skipped.
+    """
+    _check_magic(path)
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        offset, size = len(FILE_MAGIC), len(data)
+        while offset + RECORD_HEADER.size <= size:
+            timestamp_ns, key_length, value_length = RECORD_HEADER.unpack_from(data, offset)
+            offset += RECORD_HEADER.size
+            end = offset + max(key_length, 0) + value_length
+            if end > size:
+                return
+            key = data[offset:offset + key_length] if key_length >= 0 else None
+            yield timestamp_ns, key, data[end - value_length:end]
+            offset = end
+
+
+def restamp(value: bytes, serializer) -> bytes:
+    """Sets the created_at (or created_at_ns) of an encoded package to now, on the clock producers stamp it with."""
+    package = serializer.deserialize(value)
+    if "created_at_ns" in package:
+        package["created_at_ns"] = now_ns()
+    else:
+        package["created_at"] = wire_timestamp()
+    return serializer.serialize(package)
+
+
+def replay(path: str, producer, topic: str = "SENSOR_DATA", speed: float = 1.0, serializer=None) -> tuple:
+    """Sends the records of a recording to `topic` at `speed` times the recorded pace.
+
+    With a `serializer` each package is restamped when it is sent, so consumers
+    measure latency from the replay rather than the recording. Returns (records
+    sent, elapsed seconds, seconds the replay fell behind the schedule at most).
+    """
+    start = time.perf_counter()
+    first = None
+    sent = 0
+    max_lag = 0.0
+    for timestamp_ns, key, value in read_records(path):
+        if speed:
+            if first is None:
+                first = timestamp_ns
+            wait = start + (timestamp_ns - first) / 1e9 / speed - time.perf_counter()
+            if wait > MIN_SLEEP:
+                time.sleep(wait)
+            elif wait < 0:
+                max_lag = max(max_lag, -wait)
+        if serializer is not None:
+            value = restamp(value, serializer)
+        send_raw(value, key, topic, producer)
+        sent += 1
+    producer.flush()
+    return sent, time.perf_counter() - start, max_lag
+
+
+def load_broker(path: str, topic: str = "SENSOR_DATA", broker: FakeBroker = None) -> FakeBroker:
+    """Appends the records of a recording to `topic` of a FakeBroker, keeping their timestamps."""
+    if broker is None:
+        broker = FakeBroker()
+    for timestamp_ns, key, value in read_records(path):
+        broker.append(topic, value, key=key, timestamp_ms=timestamp_ns // 1_000_000)
+    return broker
+
+
+class ReplayConsumer(FakeConsumer):
+    """FakeConsumer that delivers each record no earlier than its recorded time, scaled by `speed`.
+
+    A `speed` of 0 delivers as fast as FakeConsumer. With a `serializer` each
+    package is restamped (see restamp) when it is handed to the consumer.
+    """
+
+    def __init__(self, broker: FakeBroker, *topics: str, speed: float = 1.0, serializer=None, **kwargs):
+        super().__init__(broker, *topics, **kwargs)
+        self.speed = speed
+        self.serializer = serializer
+        self._first = min((records[0].timestamp for records in self._pending.values() if records), default=0)
+        self._start = None
+
+    def __iter__(self):
+        for record in super().__iter__():
+            yield self._restamp(record)
+
+    def poll(self, timeout_ms: int = 0, max_records: int = None, update_offsets: bool = True) -> dict:
+        batches = super().poll(timeout_ms, max_records, update_offsets)
+        return {tp: [self._restamp(record) for record in records] for tp, records in batches.items()}
+
+    def _fetch(self, max_records: int) -> dict:
+        if not self.speed:
+            return super()._fetch(max_records)
+        if self.poll_latency:
+            time.sleep(self.poll_latency)
+        if self._start is None:
+            self._start = time.perf_counter()
+        upcoming = [records[self._positions[tp]].timestamp for tp, records in self._pending.items()
+                    if self._positions[tp] < len(records)]
+        if not upcoming:
+            return {}
+        wait = (min(upcoming) - self._first) / 1000 / self.speed - (time.perf_counter() - self._start)
+        if wait > 0:
+            time.sleep(wait)
+        due = self._first + (time.perf_counter() - self._start) * 1000 * self.speed
+        batches = {}
+        for tp, records in self._pending.items():
+            position = end = self._positions[tp]
+            while end < len(records) and end - position < max_records and records[end].timestamp <= due:
+                end += 1
+            if end > position:
+                batches[tp] = records[position:end]
+                self._positions[tp] = end
+                max_records -= end - position
+        return batches
+
+    def _restamp(self, record):
+        # Restamped when handed to the consumer, so the latency excludes the wait in a fetched batch
+        if self.serializer is None:
+            return record
+        return record._replace(value=restamp(record.value, self.serializer))
+
+
+def info(path: str) -> None:
+    records = 0
+    size = 0
+    first = last = None
+    for timestamp_ns, key, value in read_records(path):
+        records += 1
+        size += len(value)
+        first = timestamp_ns if first is None else first
+        last = timestamp_ns
+    duration = (last - first) / 1e9 if records else 0.0
+    print(f"{path}: {records} records, {size / max(records, 1):.0f} bytes per value, {duration:.1f}s"
+          f" recorded ({records / duration if duration else 0:,.0f} records/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and replay SENSOR_DATA recordings.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    info_parser = commands.add_parser("info", help="print the size and rate of a recording")
+    info_parser.add_argument("path")
+    for name, description in [("kafka", "replay into Kafka"),
+                              ("consume", "replay through recive_msg_with_logging in this process")]:
+        command = commands.add_parser(name, help=description)
+        command.add_argument("path")
+        command.add_argument("--speed", type=float, default=1.0,
+                             help="multiple of the recorded pace (0 replays as fast as possible)")
+        command.add_argument("--serializer", choices=["json", "avro"], default="json",
+                             help="wire format of the recorded records")
+        command.add_argument("--keep-timestamps", action="store_true",
+                             help="send the recorded created_at instead of the time of the replay")
+    commands.choices["kafka"].add_argument("--topic", default="SENSOR_DATA")
+    commands.choices["consume"].add_argument("--log-dir", default=None,
+                                             help="directory of the consumer's logs (a temporary one by default)")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        info(args.path)
+        return
+    serializer = get_serializer(args.serializer)
+    restamp_with = None if args.keep_timestamps else serializer
+
+    if args.command == "kafka":
+        sent, elapsed, max_lag = replay(args.path, get_shared_producer(), topic=args.topic, speed=args.speed,
+                                        serializer=restamp_with)
+        print(f"Replayed {sent} records in {elapsed:.1f}s ({sent / elapsed:,.0f} records/s),"
+              f" at most {max_lag * 1000:.1f}ms behind schedule")
+        return
+
+    broker = load_broker(args.path)
+    consumer = ReplayConsumer(broker, "SENSOR_DATA", speed=args.speed, serializer=restamp_with)
+    latency = LatencyTracker()
+    total = sum(len(records) for records in broker.topics.get("SENSOR_DATA", []))
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        try:
+            recive_msg_with_logging(consumer, base_dir=args.log_dir or tmp, serializer=serializer,
+                                    latency=latency, producer=FakeProducer())
+        except StopConsuming:
+            pass
+        elapsed = time.perf_counter() - start
+    print(f"Consumed {total} records in {elapsed:.1f}s ({total / elapsed:,.0f} records/s)")
+    latency.report()
+
+
+if __name__ == "__main__":
+    main()
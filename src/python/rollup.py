@@ -0,0 +1,211 @@
+from client import DEFAULT_BATCH_SIZE, DEFAULT_SERIALIZER, detect_anomalies, get_shared_producer, send_msg
+from clock import datetime_to_ns, now_ns
+from data_model import PackageObj, clean_dimensions
+import math
+
+ROLLUP_TOPIC: str = "SENSOR_ROLLUP"
+# Tumbling window sizes in seconds
+DEFAULT_WINDOWS: tuple[int, ...] = (1, 60)
+# Seconds an event may arrive after a newer one and still be counted in its window
+DEFAULT_ALLOWED_LATENESS: float = 2.0
+
+FIELDS: tuple[str, ...] = ("pressure", "temperature", "length", "width")
+
+
+class FieldStats:
+    """Count, min, max and sum of one measurement, O(1) per update."""
+
+    __slots__ = ("count", "min", "max", "total")
+
+    def __init__(self):
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.total = 0.0
+
+    def update(self, x: float) -> None:
+        self.count += 1
+        self.total += x
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    def to_dict(self) -> dict:
+        if not self.count:
+            return None
+        return {"min": self.min, "max": self.max, "mean": self.total / self.count}
+
+
+class WindowAggregate:
+    """Aggregate of one sensor in one tumbling window."""
+
+    __slots__ = ("sensor_id", "size", "start", "count", "anomalies", "fields")
+
+    def __init__(self, sensor_id: int, size: int, start: int):
+        self.sensor_id = sensor_id
+        self.size = size
+        self.start = start
+        self.count = 0
+        self.anomalies = 0
+        self.fields = {name: FieldStats() for name in FIELDS}
+
+    def to_dict(self) -> dict:
+        return {
+            "sensor_id": self.sensor_id,
+            "window": self.size,
+            "start": self.start,
+            "count": self.count,
+            "anomalies": self.anomalies,
+            **{name: stats.to_dict() for name, stats in self.fields.items()},
+        }
+
+
+def event_time(package: PackageObj) -> float:
+    """UNIX time of a package in seconds, from created_at_ns when it has one.
+
+    created_at is a naive UTC datetime, so it is converted as UTC rather than with
+    .timestamp(), which would read it as local time and shift the windows by the
+    UTC offset. Both kinds of package then share the clock of now_ns.
+    """
+    ns = package.created_at_ns if package.created_at_ns is not None else datetime_to_ns(package.created_at)
+    return ns / 1e9
+
+
+class RollupAggregator:
+    """Tumbling-window rollups per sensor for several window sizes.
+
+    Windows are keyed by event time. The watermark trails the newest event time
+    by `allowed_lateness` seconds; a window is emitted once its end passes the
+    watermark, and events for a window that was already emitted are counted as
+    late and dropped. State is one WindowAggregate per open window and sensor.
+    """
+
+    def __init__(self, windows: tuple[int, ...] = DEFAULT_WINDOWS,
+                 allowed_lateness: float = DEFAULT_ALLOWED_LATENESS):
+        self.windows = windows
+        self.allowed_lateness = allowed_lateness
+        self.watermark = -math.inf
+        # window size -> window start -> sensor_id -> aggregate
+        self._open: dict[int, dict[int, dict[int, WindowAggregate]]] = {size: {} for size in windows}
+        self._next_close = math.inf
+        self.events = 0
+        self.late = 0
+        self.emitted = 0
+
+    def add(self, package: PackageObj, anomalies=()) -> list[dict]:
+        """Adds a package and returns the rollups of the windows this closed."""
+        self.events += 1
+        t = event_time(package)
+        payload = package.payload
+        dimensions = clean_dimensions(payload.dimensions) or {}
+        values = (payload.pressure, payload.temperature, dimensions.get("length"), dimensions.get("width"))
+
+        for size in self.windows:
+            start = int(t // size) * size
+            if start + size <= self.watermark:
+                self.late += 1
+                continue
+            sensors = self._open[size].get(start)
+            if sensors is None:
+                sensors = self._open[size][start] = {}
+                self._next_close = min(self._next_close, start + size)
+            aggregate = sensors.get(payload.sensor_id)
+            if aggregate is None:
+                aggregate = sensors[payload.sensor_id] = WindowAggregate(payload.sensor_id, size, start)
+            aggregate.count += 1
+            if anomalies:
+                aggregate.anomalies += 1
+            for name, value in zip(FIELDS, values):
+                if value is not None:
+                    aggregate.fields[name].update(value)
+
+        return self.advance(t - self.allowed_lateness)
+
+    def advance(self, watermark: float) -> list[dict]:
+        """Moves the watermark forward (never back) and returns the rollups of the windows it closed."""
+        if watermark <= self.watermark:
+            return []
+        self.watermark = watermark
+        if watermark < self._next_close:
+            return []
+        rollups = []
+        self._next_close = math.inf
+        for size, starts in self._open.items():
+            for start in sorted(starts):
+                if start + size > watermark:
+                    self._next_close = min(self._next_close, start + size)
+                    break
+                rollups.extend(aggregate.to_dict() for aggregate in starts.pop(start).values())
+        self.emitted += len(rollups)
+        return rollups
+
+    def idle(self, now: float = None) -> list[dict]:
+        """Advances the watermark by the clock of event_time, for when no events arrive."""
+        if now is None:
+            now = now_ns() / 1e9
+        return self.advance(now - self.allowed_lateness)
+
+    def flush(self) -> list[dict]:
+        """Returns the rollups of all open windows, e.g. on shutdown."""
+        rollups = [
+            aggregate.to_dict()
+            for starts in self._open.values()
+            for sensors in starts.values()
+            for aggregate in sensors.values()
+        ]
+        for starts in self._open.values():
+            starts.clear()
+        self._next_close = math.inf
+        self.emitted += len(rollups)
+        return rollups
+
+    def report(self) -> None:
+        ratio = self.events / self.emitted if self.emitted else 0.0
+        print(f"Rollups: {self.events} events, {self.emitted} rollups ({ratio:,.0f}x fewer), {self.late} late")
+
+
+def recive_msg_rollup(
+        consumer,
+        aggregator: RollupAggregator = None,
+        producer=None,
+        topic: str = ROLLUP_TOPIC,
+        serializer=None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        timeout_ms: int = 1000,
+        detector=None,
+):
+    """Consumes SENSOR_DATA and publishes per-sensor window rollups as JSON to `topic`.
+
+    When a poll returns nothing the watermark is advanced by the clock (see
+    RollupAggregator.idle), so the last windows are emitted even if no further
+    events arrive.
+    """
+    if aggregator is None:
+        aggregator = RollupAggregator()
+    if producer is None:
+        producer = get_shared_producer()
+    if serializer is None:
+        serializer = DEFAULT_SERIALIZER
+
+    def publish(rollups: list[dict]) -> None:
+        for rollup in rollups:
+            send_msg(key=str(rollup["sensor_id"]), value=rollup, topic=topic, producer=producer)
+
+    try:
+        while True:
+            batches = consumer.poll(timeout_ms=timeout_ms, max_records=batch_size)
+            records = [record for partition in batches.values() for record in partition]
+            if not records:
+                publish(aggregator.idle())
+                continue
+            for msg in records:
+                package = PackageObj(**serializer.deserialize(msg.value))
+                anomalies = detector.check(package) if detector is not None else detect_anomalies(package)
+                publish(aggregator.add(package, anomalies))
+
+    except Exception as e:
+        print(f"Error consuming messages: {e}")
+    finally:
+        publish(aggregator.flush())
+        aggregator.report()
@@ -0,0 +1,208 @@
+from data_model import clean_dimensions, to_timestamp
+from clock import NS_SCHEMA_VERSION
+from urllib import request
+import fastavro
+import struct
+import json
+import io
+
+# Format http://<service name>:<port>, see cluster/kafka-schema-registry.yaml
+SCHEMA_REGISTRY_URL: str = "http://kafka-schema-registry:8081"
+
+# Avro schemas for PackageObj keyed by PackageObj.schema_version
+PACKAGE_SCHEMAS: dict[int, dict] = {
+    1: {
+        "type": "record",
+        "name": "PackageObj",
+        "namespace": "acaa",
+        "fields": [
+            {
+                "name": "payload",
+                "type": {
+                    "type": "record",
+                    "name": "SensorObj",
+                    "fields": [
+                        {"name": "sensor_id", "type": "int"},
+                        {"name": "pressure", "type": "double"},
+                        {"name": "temperature", "type": "double"},
+                        {"name": "dimensions", "type": {"type": "map", "values": "double"}},
+                    ],
+                },
+            },
+            {"name": "correlation_id", "type": "string"},
+            {"name": "created_at", "type": "double"},
+            {"name": "schema_version", "type": "int"},
+            # Set on alerts coalesced by suppression.AlertSuppressor
+            {
+                "name": "alert_summary",
+                "type": [
+                    "null",
+                    {
+                        "type": "record",
+                        "name": "AlertSummary",
+                        "fields": [
+                            {"name": "anomaly_type", "type": "string"},
+                            {"name": "count", "type": "long"},
+                            {"name": "min", "type": ["null", "double"]},
+                            {"name": "max", "type": ["null", "double"]},
+                            {"name": "first_created_at", "type": "string"},
+                            {"name": "last_created_at", "type": "string"},
+                            {"name": "window", "type": "double"},
+                        ],
+                    },
+                ],
+                "default": None,
+            },
+        ],
+    },
+}
+# Version 2 carries created_at_ns, integer nanoseconds from clock.now_ns, instead of created_at
+PACKAGE_SCHEMAS[NS_SCHEMA_VERSION] = {
+    **PACKAGE_SCHEMAS[1],
+    "fields": [
+        {"name": "created_at_ns", "type": "long"} if field["name"] == "created_at" else field
+        for field in PACKAGE_SCHEMAS[1]["fields"]
+    ],
+}
+
+# Confluent wire format: magic byte followed by the big-endian schema id
+_MAGIC_BYTE: int = 0
+_HEADER = struct.Struct(">bI")
+
+
+class LocalSchemaRegistry:
+    """In-process stand-in for the schema registry, used offline and in benchmarks."""
+
+    def __init__(self):
+        self._ids: dict[tuple[str, str], int] = {}
+        self._schemas: dict[int, dict] = {}
+
+    def register(self, subject: str, schema: dict) -> int:
+        key = (subject, json.dumps(schema, sort_keys=True))
+        if key not in self._ids:
+            self._ids[key] = len(self._schemas) + 1
+            self._schemas[self._ids[key]] = schema
+        return self._ids[key]
+
+    def get_schema(self, schema_id: int) -> dict:
+        return self._schemas[schema_id]
+
+
+class SchemaRegistryClient:
+    """Minimal client for the Confluent compatible schema registry REST API.
+
+    Registered ids and fetched schemas are cached, so the registry is only
+    contacted once per schema.
+    """
+
+    def __init__(self, url: str = SCHEMA_REGISTRY_URL, timeout: float = 5.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self._ids: dict[tuple[str, str], int] = {}
+        self._schemas: dict[int, dict] = {}
+
+    def register(self, subject: str, schema: dict) -> int:
+        schema_str = json.dumps(schema, sort_keys=True)
+        key = (subject, schema_str)
+        if key not in self._ids:
+            response = self._request(f"/subjects/{subject}/versions", {"schema": schema_str})
+            self._ids[key] = response["id"]
+            self._schemas[response["id"]] = schema
+        return self._ids[key]
+
+    def get_schema(self, schema_id: int) -> dict:
+        if schema_id not in self._schemas:
+            response = self._request(f"/schemas/ids/{schema_id}")
+            self._schemas[schema_id] = json.loads(response["schema"])
+        return self._schemas[schema_id]
+
+    def _request(self, path: str, body: dict = None) -> dict:
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = request.Request(
+            self.url + path,
+            data=data,
+            headers={"Content-Type": "application/vnd.schemaregistry.v1+json"},
+        )
+        with request.urlopen(req, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+
+class JsonSerializer:
+    """The original wire format: the PackageObj.to_dict() output as UTF-8 JSON."""
+
+    def serialize(self, value: dict) -> bytes:
+        return json.dumps(value).encode("utf-8")
+
+    def deserialize(self, data: bytes) -> dict:
+        return json.loads(data)
+
+
+class AvroSerializer:
+    """Schemaless Avro encoding of PackageObj dicts in the Confluent wire format."""
+
+    def __init__(self, registry=None, subject: str = "SENSOR_DATA-value"):
+        self.registry = registry if registry is not None else SchemaRegistryClient()
+        self.subject = subject
+        self._writers: dict[int, tuple[int, dict]] = {}
+        self._readers: dict[int, dict] = {}
+
+    def serialize(self, value: dict) -> bytes:
+        schema_version = value.get("schema_version", 1)
+        schema_id, schema = self._writer(schema_version)
+        payload = value["payload"]
+        record = {
+            "payload": {
+                "sensor_id": int(payload["sensor_id"]),
+                "pressure": payload["pressure"],
+                "temperature": payload["temperature"],
+                "dimensions": clean_dimensions(payload["dimensions"]),
+            },
+            "correlation_id": value["correlation_id"],
+            "schema_version": schema_version,
+        }
+        if schema_version == NS_SCHEMA_VERSION:
+            record["created_at_ns"] = int(value["created_at_ns"])
+        else:
+            record["created_at"] = to_timestamp(value["created_at"])
+        record["alert_summary"] = value.get("alert_summary")
+        buffer = io.BytesIO()
+        buffer.write(_HEADER.pack(_MAGIC_BYTE, schema_id))
+        fastavro.schemaless_writer(buffer, schema, record)
+        return buffer.getvalue()
+
+    def deserialize(self, data: bytes) -> dict:
+        magic, schema_id = _HEADER.unpack_from(data)
+        if magic != _MAGIC_BYTE:
+            raise ValueError(f"Unknown magic byte: {magic}")
+        buffer = io.BytesIO(data)
+        buffer.seek(_HEADER.size)
+        value = fastavro.schemaless_reader(buffer, self._reader(schema_id))
+        # Only alerts carry a summary, as in the JSON encoding
+        if value.get("alert_summary") is None:
+            value.pop("alert_summary", None)
+        return value
+
+    def _writer(self, schema_version: int) -> tuple[int, dict]:
+        if schema_version not in self._writers:
+            schema = PACKAGE_SCHEMAS[schema_version]
+            schema_id = self.registry.register(self.subject, schema)
+            self._writers[schema_version] = (schema_id, fastavro.parse_schema(schema))
+        return self._writers[schema_version]
+
+    def _reader(self, schema_id: int) -> dict:
+        if schema_id not in self._readers:
+            self._readers[schema_id] = fastavro.parse_schema(self.registry.get_schema(schema_id))
+        return self._readers[schema_id]
+
+
+def get_serializer(name: str = "json", registry=None):
+    """Returns a serializer by name ("json" or "avro").
+
+    Avro uses the cluster schema registry unless another registry, such as
+    LocalSchemaRegistry, is given.
+    """
+    if name == "json":
+        return JsonSerializer()
+    if name == "avro":
+        return AvroSerializer(registry=registry)
+    raise ValueError(f"Unknown serializer: {name}")
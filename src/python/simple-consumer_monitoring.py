@@ -1,19 +1,80 @@
-from client import get_consumer, DEFAULT_CONSUMER, recive_msg_with_logging
-import sys
+from client import get_consumer, DEFAULT_CONSUMER, DEFAULT_BATCH_SIZE, recive_msg_with_logging, recive_msg_batch
+from serializers import get_serializer
+from latency import LatencyTracker
+from sinks import get_sink
+from profiling import get_profiler
+from async_pipeline import recive_msg_async
+from detection import AnomalyDetector
+from suppression import AlertSuppressor
+from dedup import DEFAULT_TTL, Deduplicator
+import argparse
+import os
 
 
 def main():
-    args = sys.argv[1:]
-    group_id = args[0] if len(args) == 1 else DEFAULT_CONSUMER
+    parser = argparse.ArgumentParser()
+    parser.add_argument("group_id", nargs="?", default=DEFAULT_CONSUMER)
+    parser.add_argument("--batch-size", type=int, default=0,
+                        help="consume in batches of up to N records (0 consumes one record at a time)")
+    parser.add_argument("--serializer", choices=["json", "avro"], default="json",
+                        help="wire format of the consumed records")
+    parser.add_argument("--latency-port", type=int, default=0,
+                        help="serve latency percentiles in Prometheus format on this port (0 disables)")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="run fetch, decode, alerting and logging as concurrent asyncio stages")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="use the per-sensor rolling z-score detector in addition to the static ranges")
+    parser.add_argument("--suppress-window", type=float, default=0,
+                        help="coalesce alerts per sensor and anomaly type within this many seconds (0 disables);"
+                             " not used with --batch-size")
+    parser.add_argument("--raw-alerts", action="store_true",
+                        help="forward anomalous records unchanged to ALERT, with the anomalies as headers")
+    parser.add_argument("--dedup", action="store_true",
+                        help="skip records whose correlation_id was already consumed, checkpointing the filter"
+                             " to logs/dedup/<group_id>.bin before each offset commit;"
+                             " not supported with --batch-size or --async")
+    parser.add_argument("--dedup-ttl", type=float, default=DEFAULT_TTL,
+                        help="seconds a correlation_id is remembered by --dedup")
+    parser.add_argument("--sink", choices=["csv", "parquet"], default="csv", help="format of the log files")
+    args = parser.parse_args()
+    if args.dedup and (args.batch_size > 0 or args.use_async):
+        parser.error("--dedup is not supported with --batch-size or --async")
+    serializer = get_serializer(args.serializer)
+    latency = LatencyTracker(snapshot_dir="logs/latency")
+    if args.latency_port:
+        latency.serve(args.latency_port)
+    profiler = get_profiler(snapshot_dir="logs/profile")  # Enabled by the ACAA_PROFILE variable
+    sink = get_sink(args.sink, "logs", "sensor_monitoring")
+    detector = AnomalyDetector() if args.adaptive else None
+    suppressor = AlertSuppressor(window=args.suppress_window) if args.suppress_window > 0 else None
+    group_id = args.group_id
+    dedup = None
+    if args.dedup:
+        dedup = Deduplicator.load(os.path.join("logs", "dedup", f"{group_id}.bin"), ttl=args.dedup_ttl)
 
     print(f"group_id={group_id}")
-    consumer = get_consumer("SENSOR_DATA", group_id=group_id)
+    if (args.batch_size > 0 or args.dedup) and not args.use_async:
+        consumer = get_consumer("SENSOR_DATA", group_id=group_id, enable_auto_commit=False)
+    else:
+        consumer = get_consumer("SENSOR_DATA", group_id=group_id)
     try:
-        recive_msg_with_logging(consumer)
+        if args.use_async:
+            recive_msg_async(consumer, sink=sink, serializer=serializer, latency=latency,
+                             batch_size=args.batch_size or DEFAULT_BATCH_SIZE, detector=detector,
+                             suppressor=suppressor, raw_alerts=args.raw_alerts, profiler=profiler)
+        elif args.batch_size > 0:
+            recive_msg_batch(consumer, batch_size=args.batch_size,
+                             alert_topic="ALERT", sink=sink, serializer=serializer, latency=latency,
+                             detector=detector, profiler=profiler)
+        else:
+            recive_msg_with_logging(consumer, sink=sink, serializer=serializer, latency=latency,
+                                    detector=detector, suppressor=suppressor, profiler=profiler,
+                                    raw_alerts=args.raw_alerts, dedup=dedup)
 
     except KeyboardInterrupt:
         pass
     finally:
+        latency.close()
         consumer.close()
 
 
@@ -1,19 +1,59 @@
-from client import get_consumer, recive_msg, DEFAULT_CONSUMER, recive_msg_with_logging
-import sys
+from client import get_consumer, recive_msg, DEFAULT_CONSUMER, recive_msg_with_logging, recive_msg_batch
+from serializers import get_serializer
+from latency import LatencyTracker
+from sinks import get_sink
+from profiling import get_profiler
+from dedup import DEFAULT_TTL, Deduplicator
+import argparse
+import os
 
 
 def main():
-    args = sys.argv[1:]
-    group_id = args[0] if len(args) == 1 else DEFAULT_CONSUMER
+    parser = argparse.ArgumentParser()
+    parser.add_argument("group_id", nargs="?", default=DEFAULT_CONSUMER)
+    parser.add_argument("--batch-size", type=int, default=0,
+                        help="consume in batches of up to N records (0 consumes one record at a time)")
+    parser.add_argument("--serializer", choices=["json", "avro"], default="json",
+                        help="wire format of the consumed records")
+    parser.add_argument("--latency-port", type=int, default=0,
+                        help="serve latency percentiles in Prometheus format on this port (0 disables)")
+    parser.add_argument("--dedup", action="store_true",
+                        help="skip records whose correlation_id was already consumed, checkpointing the filter"
+                             " to logs/dedup/<group_id>.bin before each offset commit; not supported with --batch-size")
+    parser.add_argument("--dedup-ttl", type=float, default=DEFAULT_TTL,
+                        help="seconds a correlation_id is remembered by --dedup")
+    parser.add_argument("--sink", choices=["csv", "parquet"], default="csv", help="format of the log files")
+    args = parser.parse_args()
+    if args.dedup and args.batch_size > 0:
+        parser.error("--dedup is not supported with --batch-size")
+    serializer = get_serializer(args.serializer)
+    latency = LatencyTracker(snapshot_dir="logs/latency")
+    if args.latency_port:
+        latency.serve(args.latency_port)
+    profiler = get_profiler(snapshot_dir="logs/profile")  # Enabled by the ACAA_PROFILE variable
+    sink = get_sink(args.sink, "logs", "alert")
+    group_id = args.group_id
+    dedup = None
+    if args.dedup:
+        dedup = Deduplicator.load(os.path.join("logs", "dedup", f"{group_id}.bin"), ttl=args.dedup_ttl)
 
     print(f"group_id={group_id}")
-    consumer = get_consumer("ALERT", group_id=group_id)
+    if args.batch_size > 0 or args.dedup:
+        consumer = get_consumer("ALERT", group_id=group_id, enable_auto_commit=False)
+    else:
+        consumer = get_consumer("ALERT", group_id=group_id)
     try:
-        recive_msg(consumer)
+        if args.batch_size > 0:
+            recive_msg_batch(consumer, batch_size=args.batch_size,
+                             sink=sink, serializer=serializer, latency=latency, profiler=profiler)
+        else:
+            recive_msg(consumer, sink=sink, serializer=serializer, latency=latency, profiler=profiler,
+                       dedup=dedup)
 
     except KeyboardInterrupt:
         pass
     finally:
+        latency.close()
         consumer.close()
 
 
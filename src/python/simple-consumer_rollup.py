@@ -0,0 +1,38 @@
+from client import get_consumer, DEFAULT_BATCH_SIZE
+from serializers import get_serializer
+from detection import AnomalyDetector
+from rollup import DEFAULT_ALLOWED_LATENESS, DEFAULT_WINDOWS, ROLLUP_TOPIC, RollupAggregator, recive_msg_rollup
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("group_id", nargs="?", default="ROLLUP_CONSUMER")
+    parser.add_argument("--windows", type=int, nargs="+", default=list(DEFAULT_WINDOWS),
+                        help="tumbling window sizes in seconds")
+    parser.add_argument("--allowed-lateness", type=float, default=DEFAULT_ALLOWED_LATENESS,
+                        help="seconds an event may lag the newest event and still be counted")
+    parser.add_argument("--topic", default=ROLLUP_TOPIC, help="topic the rollups are published to")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--serializer", choices=["json", "avro"], default="json",
+                        help="wire format of the consumed records")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="count anomalies with the per-sensor rolling z-score detector")
+    args = parser.parse_args()
+    aggregator = RollupAggregator(windows=tuple(args.windows), allowed_lateness=args.allowed_lateness)
+    detector = AnomalyDetector() if args.adaptive else None
+
+    print(f"group_id={args.group_id}")
+    consumer = get_consumer("SENSOR_DATA", group_id=args.group_id)
+    try:
+        recive_msg_rollup(consumer, aggregator=aggregator, topic=args.topic,
+                          serializer=get_serializer(args.serializer), batch_size=args.batch_size,
+                          detector=detector)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        consumer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+from datetime import datetime
+import pyarrow.parquet as pq
+import pyarrow as pa
+import threading
+import time
+import os
+import csv
+
+# Typed columns for the consumer logs, same names as the CSV header. Nanosecond
+# precision, so the integer nanosecond timestamps of clock.py are stored as is
+LOG_SCHEMA = pa.schema([
+    ("Sensor ID", pa.int64()),
+    ("Correlation ID", pa.string()),
+    ("Created At", pa.timestamp("ns")),
+    ("Consumed At", pa.timestamp("ns")),
+    ("Time Difference (seconds)", pa.float64()),
+])
+
+# Files that are still being written; pyarrow datasets skip names starting with "_"
+IN_PROGRESS_PREFIX: str = "_inprogress-"
+# Shortest interval of the flush timer, so a flush_interval of 0 does not spin
+MIN_TIMER_INTERVAL: float = 0.01
+
+
+class _FlushTimer:
+    """Calls `tick` every `interval` seconds in a daemon thread until stopped.
+
+    Consumers block while no records arrive, so the time based flushes of the
+    sinks cannot wait for the next write.
+    """
+
+    def __init__(self, tick, interval: float):
+        self._tick = tick
+        self.interval = max(interval, MIN_TIMER_INTERVAL)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self._tick()
+            except Exception as e:
+                print(f"Error flushing log: {e}")
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+
+class CsvSink:
+    """Long-lived CSV writer that buffers rows and appends them in batches.
+
+    Rows are flushed when `flush_rows` rows are buffered or `flush_interval`
+    seconds have passed since the last flush, checked on write and by a timer
+    thread while no rows arrive. The file is rotated when it grows
+    beyond `max_bytes` or when the hour changes (`rotate_hourly`); the active file
+    always keeps the name `file_path` so the analysis scripts can find it.
+    """
+
+    def __init__(
+            self,
+            file_path: str,
+            flush_rows: int = 1000,
+            flush_interval: float = 1.0,
+            max_bytes: int = None,
+            rotate_hourly: bool = False,
+    ):
+        self.file_path = file_path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_hourly = rotate_hourly
+        self._rows: list[dict] = []
+        self._file = None
+        self._writer = None
+        self._opened_hour = None
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+        self._timer = None
+
+    def write(self, row: dict) -> None:
+        with self._lock:
+            self._rows.append(row)
+            if len(self._rows) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+        self._start_timer()
+
+    def write_rows(self, rows: list[dict]) -> None:
+        with self._lock:
+            self._rows.extend(rows)
+            if len(self._rows) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+        self._start_timer()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._rows:
+                return
+            if self._file is None or self._should_rotate():
+                self._open(self._rows[0].keys())
+            self._writer.writerows(self._rows)
+            self._file.flush()
+            self._rows.clear()
+
+    def close(self) -> None:
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+        try:
+            self.flush()
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _start_timer(self) -> None:
+        if self._timer is None:
+            self._timer = _FlushTimer(self._tick, self.flush_interval / 2)
+
+    def _tick(self) -> None:
+        with self._lock:
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def _should_rotate(self) -> bool:
+        if self.rotate_hourly and datetime.now().strftime("%Y%m%d%H") != self._opened_hour:
+            return True
+        return self.max_bytes is not None and self._file.tell() >= self.max_bytes
+
+    def _open(self, fieldnames) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.replace(self.file_path, self._rotated_path())
+        os.makedirs(os.path.dirname(self.file_path) or ".", exist_ok=True)
+        file_exists = os.path.exists(self.file_path) and os.path.getsize(self.file_path) > 0
+        self._file = open(self.file_path, mode='a', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=list(fieldnames))
+        if not file_exists:  # Write header only for new files
+            self._writer.writeheader()
+        self._opened_hour = datetime.now().strftime("%Y%m%d%H")
+
+    def _rotated_path(self) -> str:
+        stem, ext = os.path.splitext(self.file_path)
+        rotated = f"{stem}-{datetime.now():%Y%m%d-%H%M%S}"
+        path, n = f"{rotated}{ext}", 1
+        while os.path.exists(path):
+            path, n = f"{rotated}-{n}{ext}", n + 1
+        return path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ParquetSink:
+    """Writes consumer log rows as typed Parquet row groups.
+
+    Rows are buffered per column and written as one row group when `row_group_rows`
+    rows are buffered or `flush_interval` seconds have passed. A new file is started
+    in `directory` every `roll_interval` seconds. Both intervals are also checked by
+    a timer thread, so rows and files are not held back while no rows arrive; a
+    file whose roll interval passed is closed then. Files are written under a "_"
+    prefix and renamed when closed, so readers of the directory only see complete
+    files. `schema` defaults to LOG_SCHEMA when the row keys match it.
+    """
+
+    def __init__(
+            self,
+            directory: str,
+            name: str = "log",
+            row_group_rows: int = 100_000,
+            flush_interval: float = 10.0,
+            roll_interval: float = 3600.0,
+            schema: pa.Schema = None,
+    ):
+        self.directory = directory
+        self.name = name
+        self.row_group_rows = row_group_rows
+        self.flush_interval = flush_interval
+        self.roll_interval = roll_interval
+        self.schema = schema
+        self._columns: dict[str, list] = {}
+        self._buffered = 0
+        self._writer = None
+        self._path = None
+        self._opened_at = 0.0
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+        self._timer = None
+
+    def write(self, row: dict) -> None:
+        self.write_rows([row])
+
+    def write_rows(self, rows: list[dict]) -> None:
+        if not rows:
+            return
+        with self._lock:
+            if not self._columns:
+                self._columns = {key: [] for key in rows[0]}
+            for key, values in self._columns.items():
+                values.extend(row[key] for row in rows)
+            self._buffered += len(rows)
+            if self._buffered >= self.row_group_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+        self._start_timer()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._buffered:
+                return
+            if self.schema is None:
+                self.schema = LOG_SCHEMA if list(self._columns) == LOG_SCHEMA.names else None
+            table = pa.Table.from_pydict(self._columns, schema=self.schema)
+            self.schema = table.schema
+            if self._writer is not None and time.monotonic() - self._opened_at >= self.roll_interval:
+                self._close_file()
+            if self._writer is None:
+                self._open_file()
+            self._writer.write_table(table)
+            self._columns = {key: [] for key in self._columns}
+            self._buffered = 0
+
+    def close(self) -> None:
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+        with self._lock:
+            try:
+                self.flush()
+            finally:
+                self._close_file()
+
+    def _start_timer(self) -> None:
+        if self._timer is None:
+            self._timer = _FlushTimer(self._tick, min(self.flush_interval, self.roll_interval) / 2)
+
+    def _tick(self) -> None:
+        with self._lock:
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+            if self._writer is not None and time.monotonic() - self._opened_at >= self.roll_interval:
+                self._close_file()
+
+    def _open_file(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        file_name = f"{self.name}-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}.parquet"
+        self._path = os.path.join(self.directory, file_name)
+        self._writer = pq.ParquetWriter(self._in_progress_path(), self.schema, compression="zstd")
+        self._opened_at = time.monotonic()
+
+    def _close_file(self) -> None:
+        if self._writer is None:
+            return
+        self._writer.close()
+        os.replace(self._in_progress_path(), self._path)
+        self._writer = None
+
+    def _in_progress_path(self) -> str:
+        return os.path.join(self.directory, IN_PROGRESS_PREFIX + os.path.basename(self._path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def get_sink(kind: str, base_dir: str, name: str):
+    """Returns the log sink for `name`: logs/<name>.csv or the Parquet directory logs/<name>/."""
+    if kind == "csv":
+        return CsvSink(os.path.join(base_dir, f"{name}.csv"))
+    if kind == "parquet":
+        return ParquetSink(os.path.join(base_dir, name), name=name)
+    raise ValueError(f"Unknown sink: {kind}")
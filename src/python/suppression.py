@@ -0,0 +1,134 @@
+from client import serialize_non_json
+from clock import ns_to_datetime
+from collections import OrderedDict
+from data_model import PackageObj
+import json
+import time
+
+DEFAULT_WINDOW: float = 1.0
+DEFAULT_MAX_KEYS: int = 10_000
+
+# First word of the alert strings from detect_anomalies/AnomalyDetector -> measured field
+ANOMALY_FIELDS: dict[str, str] = {
+    "Trykafvigelse": "pressure",
+    "Temperaturafvigelse": "temperature",
+}
+
+
+def _created_at(package: PackageObj):
+    """created_at_ns if set, so no datetime is built per alert, else created_at."""
+    return package.created_at_ns if package.created_at_ns is not None else package.created_at
+
+
+def _isoformat(created_at) -> str:
+    return (ns_to_datetime(created_at) if isinstance(created_at, int) else created_at).isoformat()
+
+
+class _Window:
+    __slots__ = ("opened_at", "package", "count", "min", "max", "first_at", "last_at")
+
+    def __init__(self, opened_at: float, package: PackageObj, value: float):
+        self.opened_at = opened_at
+        self.package = package
+        self.count = 1
+        self.min = value
+        self.max = value
+        self.first_at = self.last_at = _created_at(package)
+
+
+class AlertSuppressor:
+    """Coalesces alerts per (sensor_id, anomaly type) within a time window.
+
+    The first alert of a window opens it; later alerts for the same key only update
+    its count and min/max. When the window is `window` seconds old it is emitted as
+    one alert: the first package of the window plus an "alert_summary". Open windows
+    are kept in creation order, so expiry is checked from the front in O(1), and at
+    most `max_keys` windows are open at once (the oldest is emitted early when full).
+    """
+
+    def __init__(self, window: float = DEFAULT_WINDOW, max_keys: int = DEFAULT_MAX_KEYS):
+        self.window = window
+        self.max_keys = max_keys
+        self._windows: OrderedDict[tuple, _Window] = OrderedDict()
+        self.received = 0
+        self.suppressed = 0
+        self.published = 0
+        self.evicted = 0
+
+    def offer(self, package: PackageObj, anomalies, now: float = None) -> list[tuple[str, dict]]:
+        """Adds the anomalies of `package`, once per anomaly type, and returns the (key, value) alerts that are due."""
+        if now is None:
+            now = time.monotonic()
+        due = self.expire(now)
+        # A sample counts once per type, also when it was flagged for a type more than once
+        # (AnomalyDetector reports both the static range and the z-score)
+        anomaly_types = dict.fromkeys(anomaly.split(maxsplit=1)[0].rstrip(":") for anomaly in anomalies)
+        for anomaly_type in anomaly_types:
+            field = ANOMALY_FIELDS.get(anomaly_type)
+            value = getattr(package.payload, field) if field is not None else None
+            key = (package.payload.sensor_id, anomaly_type)
+            self.received += 1
+
+            current = self._windows.get(key)
+            if current is None:
+                if len(self._windows) >= self.max_keys:
+                    self.evicted += 1
+                    due.append(self._emit(*self._windows.popitem(last=False)))
+                self._windows[key] = _Window(now, package, value)
+                continue
+            self.suppressed += 1
+            current.count += 1
+            current.last_at = _created_at(package)
+            if value is not None:
+                current.min = value if current.min is None else min(current.min, value)
+                current.max = value if current.max is None else max(current.max, value)
+        return due
+
+    def expire(self, now: float = None) -> list[tuple[str, dict]]:
+        """Returns the alerts of every window older than `window` seconds."""
+        if now is None:
+            now = time.monotonic()
+        due = []
+        while self._windows:
+            key, oldest = next(iter(self._windows.items()))
+            if now - oldest.opened_at < self.window:
+                break
+            del self._windows[key]
+            due.append(self._emit(key, oldest))
+        return due
+
+    def flush(self) -> list[tuple[str, dict]]:
+        """Returns the alerts of all open windows, e.g. on shutdown."""
+        due = [self._emit(key, window) for key, window in self._windows.items()]
+        self._windows.clear()
+        return due
+
+    def report(self) -> None:
+        stats = self.stats()
+        print(f"Alerts: {stats['received']} received, {stats['published']} published, "
+              f"{stats['suppressed']} suppressed, {stats['evicted']} evicted early")
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "published": self.published,
+            "suppressed": self.suppressed,
+            "evicted": self.evicted,
+            "open_windows": len(self._windows),
+        }
+
+    def _emit(self, key: tuple, window: _Window) -> tuple[str, dict]:
+        self.published += 1
+        sensor_id, anomaly_type = key
+        # Same message as an unsuppressed alert, plus the summary of the window
+        value = json.loads(json.dumps(window.package, default=serialize_non_json))
+        value["alert_summary"] = {
+            "anomaly_type": anomaly_type,
+            "count": window.count,
+            "min": window.min,
+            "max": window.max,
+            "first_created_at": _isoformat(window.first_at),
+            "last_created_at": _isoformat(window.last_at),
+            "window": self.window,
+        }
+        return str(sensor_id), value
@@ -0,0 +1,18 @@
+import os
+import sys
+import time
+
+import pytest
+
+# The modules in src/python import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(params=["UTC", "Asia/Tokyo", "America/New_York"])
+def local_timezone(request, monkeypatch):
+    """Runs a test in local time zones on both sides of UTC."""
+    monkeypatch.setenv("TZ", request.param)
+    time.tzset()
+    yield request.param
+    monkeypatch.undo()
+    time.tzset()
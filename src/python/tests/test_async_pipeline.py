@@ -0,0 +1,41 @@
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from async_pipeline import recive_msg_async
+from data_model import generate_samples
+from fake_kafka import FakeBroker, FakeConsumer, FakeProducer
+from sinks import CsvSink
+from suppression import AlertSuppressor
+
+
+class SlowSink(CsvSink):
+    def write_rows(self, rows: list[dict]) -> None:
+        time.sleep(0.02)
+        super().write_rows(rows)
+
+
+def test_ctrl_c_drains_fetched_batches(tmp_path):
+    broker = FakeBroker()
+    for sensor_id, value in generate_samples(20_000, seed=1, as_bytes=True):
+        broker.append("SENSOR_DATA", value, key=str(sensor_id).encode("utf-8"))
+    consumer = FakeConsumer(broker, "SENSOR_DATA")
+    producer = FakeProducer()
+    suppressor = AlertSuppressor(window=3600.0)
+    path = str(tmp_path / "sensor_monitoring.csv")
+    threading.Timer(0.3, os.kill, (os.getpid(), signal.SIGINT)).start()
+
+    with pytest.raises(KeyboardInterrupt):
+        recive_msg_async(consumer, sink=SlowSink(path), producer=producer, batch_size=500, suppressor=suppressor)
+
+    fetched = sum(consumer.position(tp) for tp in consumer.assignment())
+    with open(path) as file:
+        logged = len(file.readlines()) - 1
+    assert 0 < fetched < 20_000
+    assert logged == fetched
+    # The open windows were published when the pipeline stopped
+    assert suppressor.published > 0 and not suppressor.stats()["open_windows"]
+    assert sum(len(records) for records in producer.broker.topics["ALERT"]) == suppressor.published
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from client import recive_msg
+from data_model import PackageObj, get_sensor_sample
+from dedup import Deduplicator
+from fake_kafka import FakeBroker, FakeConsumer
+from serializers import JsonSerializer
+from suppression import AlertSuppressor
+
+
+def test_coalesced_alerts_are_deduplicated_per_anomaly_type(tmp_path):
+    serializer = JsonSerializer()
+    suppressor = AlertSuppressor(window=1.0)
+    package = PackageObj(payload=get_sensor_sample(sensor_id=3))
+    suppressor.offer(package, ["Trykafvigelse: 20", "Temperaturafvigelse: 99"], now=0.0)
+    alerts = suppressor.expire(now=2.0)
+    broker = FakeBroker()
+    for key, value in alerts + alerts[:1]:  # Both windows, then the first one redelivered
+        broker.append("ALERT", serializer.serialize(value), key=key.encode("utf-8"))
+
+    dedup = Deduplicator.load(str(tmp_path / "dedup.bin"))
+    recive_msg(FakeConsumer(broker, "ALERT"), base_dir=str(tmp_path), dedup=dedup)
+
+    assert (dedup.checked, dedup.duplicates) == (3, 1)
+    with open(tmp_path / "alert.csv") as file:
+        assert len(file.readlines()) == 1 + 2
+
+
+def test_checkpoint_saves_before_committing(tmp_path):
+    class FailingCommit(FakeConsumer):
+        def commit(self, offsets=None):
+            raise RuntimeError("commit failed")
+
+    path = str(tmp_path / "dedup.bin")
+    dedup = Deduplicator(checkpoint_path=path)
+    dedup.seen("a")
+
+    with pytest.raises(RuntimeError):
+        dedup.checkpoint(FailingCommit(FakeBroker(), "ALERT"))
+
+    assert os.path.exists(path)
+    assert Deduplicator.load(path).seen("a")
@@ -0,0 +1,29 @@
+import pytest
+
+from clock import now_ns
+from data_model import PackageObj, get_sensor_sample
+from rollup import RollupAggregator, event_time
+from serializers import JsonSerializer
+
+
+def consumed(new_package) -> PackageObj:
+    """A new package as a consumer decodes it from the wire."""
+    serializer = JsonSerializer()
+    package = new_package(get_sensor_sample(sensor_id=1))
+    return PackageObj(**serializer.deserialize(serializer.serialize(package.to_dict())))
+
+
+@pytest.mark.parametrize("new_package", [PackageObj, PackageObj.new_ns], ids=["created_at", "created_at_ns"])
+def test_event_time_is_unix_time(local_timezone, new_package):
+    assert abs(event_time(consumed(new_package)) - now_ns() / 1e9) < 1.0
+
+
+def test_idle_watermark_follows_event_time(local_timezone):
+    aggregator = RollupAggregator(windows=(60,), allowed_lateness=2.0)
+    package = consumed(PackageObj)
+    assert aggregator.add(package) == []
+
+    # A window is neither closed as soon as the consumer idles nor left open indefinitely
+    assert aggregator.idle() == []
+    rollups = aggregator.idle(now=event_time(package) + 62.0)
+    assert [rollup["count"] for rollup in rollups] == [1]
@@ -0,0 +1,41 @@
+import pytest
+
+from data_model import PackageObj, get_sensor_sample
+from serializers import JsonSerializer, AvroSerializer, LocalSchemaRegistry
+from suppression import AlertSuppressor
+
+SERIALIZERS = {
+    "json": JsonSerializer,
+    "avro": lambda: AvroSerializer(registry=LocalSchemaRegistry()),
+}
+
+
+def coalesced_alert(new_package) -> dict:
+    suppressor = AlertSuppressor(window=1.0)
+    for now in (0.0, 0.5):
+        package = new_package(get_sensor_sample(sensor_id=7))
+        package.payload.pressure = 20.0 + now
+        suppressor.offer(package, ["Trykafvigelse: 20"], now=now)
+    (_, value), = suppressor.expire(now=2.0)
+    return value
+
+
+@pytest.mark.parametrize("name", SERIALIZERS)
+@pytest.mark.parametrize("new_package", [PackageObj, PackageObj.new_ns], ids=["created_at", "created_at_ns"])
+def test_alert_summary_round_trip(name, new_package):
+    serializer = SERIALIZERS[name]()
+    value = coalesced_alert(new_package)
+
+    decoded = serializer.deserialize(serializer.serialize(value))
+
+    assert decoded["alert_summary"] == value["alert_summary"]
+    assert decoded["alert_summary"]["count"] == 2
+    assert (decoded["alert_summary"]["min"], decoded["alert_summary"]["max"]) == (20.0, 20.5)
+
+
+@pytest.mark.parametrize("name", SERIALIZERS)
+def test_package_without_alert_summary(name):
+    serializer = SERIALIZERS[name]()
+    value = PackageObj(payload=get_sensor_sample(sensor_id=7)).to_dict()
+
+    assert "alert_summary" not in serializer.deserialize(serializer.serialize(value))
@@ -0,0 +1,33 @@
+import os
+import time
+
+import pyarrow.parquet as pq
+
+from sinks import IN_PROGRESS_PREFIX, CsvSink, ParquetSink
+
+ROW = {"Sensor ID": 1, "Correlation ID": "a", "Created At": 0, "Consumed At": 0, "Time Difference (seconds)": 0.0}
+
+
+def wait_for(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_csv_sink_flushes_while_idle(tmp_path):
+    path = str(tmp_path / "log.csv")
+    with CsvSink(path, flush_interval=0.05) as sink:
+        sink.write(ROW)
+        assert wait_for(lambda: os.path.exists(path) and len(open(path).readlines()) == 2)
+
+
+def test_parquet_sink_flushes_and_rolls_while_idle(tmp_path):
+    with ParquetSink(str(tmp_path), flush_interval=0.05, roll_interval=0.2) as sink:
+        sink.write(ROW)
+        # The file is closed, and so renamed to its final name, without another write
+        assert wait_for(lambda: any(not name.startswith(IN_PROGRESS_PREFIX) for name in os.listdir(tmp_path)))
+    files = os.listdir(tmp_path)
+    assert len(files) == 1 and pq.read_table(tmp_path / files[0]).num_rows == 1
@@ -0,0 +1,15 @@
+from data_model import PackageObj, get_sensor_sample
+from suppression import AlertSuppressor
+
+
+def test_sample_flagged_twice_counts_once():
+    suppressor = AlertSuppressor(window=1.0)
+    package = PackageObj(payload=get_sensor_sample(sensor_id=1))
+    # As AnomalyDetector reports a sample outside both the static range and its z-score threshold
+    anomalies = [f"Trykafvigelse: {package.payload.pressure}", f"Trykafvigelse (z=9.0): {package.payload.pressure}"]
+
+    suppressor.offer(package, anomalies, now=0.0)
+    (_, alert), = suppressor.expire(now=2.0)
+
+    assert alert["alert_summary"]["count"] == 1
+    assert (suppressor.received, suppressor.suppressed) == (1, 0)
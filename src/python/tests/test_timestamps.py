@@ -0,0 +1,34 @@
+import csv
+from datetime import datetime
+
+import pytest
+
+from client import recive_msg_batch
+from data_model import PackageObj, PackageRecord, get_sensor_sample
+from fake_kafka import FakeBroker, FakeConsumer, StopConsuming
+from serializers import JsonSerializer
+
+
+def test_from_wire_created_at_ns_is_naive_utc(local_timezone):
+    package = PackageObj.new_ns(get_sensor_sample(sensor_id=1))
+    record = PackageRecord.from_wire(JsonSerializer().serialize(package.to_dict()))
+
+    assert abs((datetime.utcnow() - record.to_package().created_at).total_seconds()) < 1.0
+
+
+def test_mixed_batch_latency_and_created_at(local_timezone, tmp_path):
+    serializer = JsonSerializer()
+    broker = FakeBroker()
+    for new_package in [PackageObj, PackageObj.new_ns] * 5:
+        broker.append("SENSOR_DATA", serializer.serialize(new_package(get_sensor_sample(sensor_id=1)).to_dict()))
+
+    with pytest.raises(StopConsuming):
+        recive_msg_batch(FakeConsumer(broker, "SENSOR_DATA"), base_dir=str(tmp_path))
+
+    with open(tmp_path / "sensor_monitoring.csv") as file:
+        rows = list(csv.DictReader(file))
+    assert len(rows) == 10
+    now = datetime.utcnow()
+    for row in rows:
+        assert 0 <= float(row["Time Difference (seconds)"]) < 1.0
+        assert abs((now - datetime.fromisoformat(row["Created At"])).total_seconds()) < 1.0